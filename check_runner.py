@@ -0,0 +1,12 @@
+"""
+Shared helper for the test scripts (test_api.py, test_pipeline.py)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+def run_concurrently(*checks):
+    """Run independent checks at the same time (they mostly wait on the network) and
+    return their results in order; their progress lines may interleave"""
+    with ThreadPoolExecutor(max_workers=len(checks)) as pool:
+        futures = [pool.submit(check) for check in checks]
+        return [future.result() for future in futures]
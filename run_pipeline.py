@@ -4,64 +4,118 @@ Complete MLOps Workflow Runner
 Orchestrates the full ML pipeline: Train -> Evaluate -> Deploy
 """
 
-import subprocess
+import asyncio
+import shlex
 import sys
-import time
 import mlflow
 import argparse
 
-def run_command(command, description):
-    """Run a command and handle errors"""
+async def run_command(args, description):
+    """Run a command (argument list) and handle errors"""
     print(f"\n🔄 {description}")
-    print(f"Running: {command}")
+    print(f"Running: {shlex.join(args)}")
     
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT
+    )
+    
+    def emit(line):
+        # A progress bar redraws itself with \r; only its final state is worth a log line
+        line = line.rstrip(b"\r").rsplit(b"\r", 1)[-1]
+        if line.strip():
+            print(f"[{description}] {line.decode(errors='replace').rstrip()}", flush=True)
     
-    if result.returncode == 0:
+    # Stream output as it is produced; steps may run concurrently, so tag each line.
+    # Read fixed-size chunks rather than lines: a long \r-only progress stream would
+    # overflow the StreamReader line limit and abort the step
+    pending = b""
+    while True:
+        chunk = await proc.stdout.read(64 * 1024)
+        if not chunk:
+            break
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            emit(line)
+        # Keep only the latest redraw of an unfinished line so the buffer stays small
+        pending = pending[pending.rfind(b"\r", 0, len(pending) - 1) + 1:]
+    emit(pending)
+    await proc.wait()
+    
+    if proc.returncode == 0:
         print(f"✅ {description} completed successfully")
-        if result.stdout:
-            print("Output:", result.stdout)
     else:
-        print(f"❌ {description} failed")
-        print("Error:", result.stderr)
+        print(f"❌ {description} failed (exit code {proc.returncode})")
         return False
     return True
 
-def run_local_training():
+async def run_local_training():
     """Run training locally with MLflow tracking"""
-    return run_command(
-        "python scripts/train.py",
+    return await run_command(
+        [sys.executable, "scripts/train.py"],
         "Local Training with MLflow Tracking"
     )
 
-def run_sagemaker_training():
+async def run_sagemaker_training():
     """Launch SageMaker training job"""
-    return run_command(
-        "python scripts/sagemaker_train.py",
+    return await run_command(
+        [sys.executable, "scripts/sagemaker_train.py"],
         "SageMaker Training Job"
     )
 
-def run_evaluation():
+async def run_evaluation():
     """Run model evaluation and promotion"""
-    return run_command(
-        "python scripts/evaluate.py",
+    return await run_command(
+        [sys.executable, "scripts/evaluate.py"],
         "Model Evaluation and Promotion"
     )
 
-def run_deployment():
+async def run_deployment():
     """Deploy to SageMaker endpoint"""
-    return run_command(
-        "python scripts/deploy.py",
+    return await run_command(
+        [sys.executable, "scripts/deploy.py"],
         "SageMaker Deployment"
     )
 
-def run_monitoring():
+async def run_monitoring():
     """Run model monitoring"""
-    return run_command(
-        "python scripts/monitor.py",
+    return await run_command(
+        [sys.executable, "scripts/monitor.py"],
         "Model Monitoring"
     )
 
+async def run_pipeline(args):
+    """Run the pipeline steps, overlapping the ones that are independent"""
+    # Step 1: Training
+    if not args.skip_training:
+        if args.mode == "local":
+            if not await run_local_training():
+                sys.exit(1)
+        elif args.mode == "sagemaker":
+            if not await run_sagemaker_training():
+                sys.exit(1)
+        elif args.mode == "full":
+            # Run both for comparison; they are independent so run them concurrently
+            print("🔄 Running both local and SageMaker training...")
+            await asyncio.gather(run_local_training(), run_sagemaker_training())
+    
+    # Step 2: Evaluation (compare models and promote)
+    print("\n" + "="*50)
+    if not await run_evaluation():
+        print("⚠️ Evaluation failed, but continuing...")
+    
+    # Step 3: Deployment
+    print("\n" + "="*50)
+    if not await run_deployment():
+        print("❌ Deployment failed!")
+        sys.exit(1)
+    
+    # Step 4: Monitoring (optional)
+    if args.mode == "full":
+        print("\n" + "="*50)
+        await run_monitoring()
+
 def main():
     parser = argparse.ArgumentParser(description="MLOps Pipeline Runner")
     parser.add_argument(
@@ -86,39 +140,7 @@ Skip Training: {args.skip_training}
 """)
     
     try:
-        # Step 1: Training
-        if not args.skip_training:
-            if args.mode == "local":
-                if not run_local_training():
-                    sys.exit(1)
-            elif args.mode == "sagemaker":
-                if not run_sagemaker_training():
-                    sys.exit(1)
-            elif args.mode == "full":
-                # Run both for comparison
-                print("🔄 Running both local and SageMaker training...")
-                run_local_training()
-                time.sleep(2)
-                run_sagemaker_training()
-        
-        # Step 2: Evaluation (compare models and promote)
-        print("\n" + "="*50)
-        time.sleep(2)
-        if not run_evaluation():
-            print("⚠️ Evaluation failed, but continuing...")
-        
-        # Step 3: Deployment
-        print("\n" + "="*50)
-        time.sleep(2)
-        if not run_deployment():
-            print("❌ Deployment failed!")
-            sys.exit(1)
-        
-        # Step 4: Monitoring (optional)
-        if args.mode == "full":
-            print("\n" + "="*50)
-            time.sleep(2)
-            run_monitoring()
+        asyncio.run(run_pipeline(args))
         
         print(f"""
 🎉 MLOps Pipeline Complete!
@@ -1,170 +1,392 @@
-import boto3, mlflow, os, time, json, tarfile
+import boto3, mlflow, os, time, json, tarfile, shutil, subprocess, posixpath, hashlib, argparse
+from functools import lru_cache
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from mlflow.store.artifact.artifact_repository_registry import get_artifact_repository
 import sagemaker
 from sagemaker.model import Model
 from sagemaker.predictor import Predictor
 from sagemaker.xgboost.model import XGBoostModel
-import numpy as np
-import pandas as pd
+from sagemaker.serverless import ServerlessInferenceConfig
+from sagemaker.multidatamodel import MultiDataModel
 
 MLFLOW_TRACKING_URI="http://13.203.199.220:32001/"
 mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
-client=mlflow.tracking.MlflowClient()
 
-sm=boto3.client("sagemaker",region_name="ap-south-1")
-sagemaker_session = sagemaker.Session()
+# Downloaded artifacts and tarballs are kept per model version between deploys
+MODEL_CACHE_DIR = os.path.expanduser(os.environ.get("MODEL_CACHE_DIR", "~/.cache/mlflow-deploy"))
+
+# Large parts and many parallel PUTs for multi-hundred-MB model tarballs
+_XFER = TransferConfig(multipart_threshold=16*1024*1024, multipart_chunksize=64*1024*1024, max_concurrency=32)
+
+REGION = "ap-south-1"
+
+# Clients and the SageMaker session are built on first use so importing this
+# module stays fast and works offline
+@lru_cache(maxsize=1)
+def _client():
+    return mlflow.tracking.MlflowClient()
+
+# One boto3 session behind every AWS client, including the SageMaker session's
+@lru_cache(maxsize=1)
+def _boto_session():
+    return boto3.session.Session(region_name=REGION)
+
+@lru_cache(maxsize=1)
+def _sm():
+    return _boto_session().client("sagemaker")
+
+@lru_cache(maxsize=1)
+def _s3():
+    # Enough pooled connections for the parallel artifact downloads and multipart uploads
+    return _boto_session().client("s3", config=Config(max_pool_connections=32))
+
+@lru_cache(maxsize=1)
+def _sts():
+    return _boto_session().client("sts")
+
+@lru_cache(maxsize=1)
+def _iam():
+    return _boto_session().client("iam")
+
+@lru_cache(maxsize=1)
+def _sagemaker_session():
+    return sagemaker.Session(boto_session=_boto_session(), sagemaker_client=_sm())
+
+# Resolved role ARN and account id, reused by later runs until each entry is a day old.
+# Entries are stored per AWS credentials, so another profile or account never sees them.
+ROLE_CACHE_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "deploy_eta", "role.json")
+ROLE_CACHE_TTL = 24 * 3600
+SAGEMAKER_ROLE_NAMES = ["AmazonSageMaker-ExecutionRole-default", "AmazonSageMaker-ExecutionRole"]
+
+def _role_cache_key():
+    # Hash of the access key id: identifies the caller without an STS call or storing the key
+    credentials = _boto_session().get_credentials()
+    if credentials is None:
+        return None
+    return hashlib.sha256(credentials.access_key.encode()).hexdigest()
+
+def _load_role_cache():
+    try:
+        with open(ROLE_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _read_role_cache(name):
+    key = _role_cache_key()
+    entry = _load_role_cache().get(key, {}).get(name) if key else None
+    if entry and time.time() - entry.get("ts", 0) < ROLE_CACHE_TTL:
+        return entry.get("value")
+    return None
+
+def _write_role_cache(name, value):
+    key = _role_cache_key()
+    if not key:
+        return
+    cached = _load_role_cache()
+    cached.setdefault(key, {})[name] = {"value": value, "ts": time.time()}
+    try:
+        os.makedirs(os.path.dirname(ROLE_CACHE_PATH), exist_ok=True)
+        with open(ROLE_CACHE_PATH, "w") as f:
+            json.dump(cached, f)
+    except OSError:
+        pass
+
+def _account_id():
+    account = _read_role_cache("account")
+    if not account:
+        account = _sts().get_caller_identity()["Account"]
+        _write_role_cache("account", account)
+    return account
+
+def _discover_sagemaker_role():
+    # Conventional names first: one GetRole call each instead of scanning every role
+    for name in SAGEMAKER_ROLE_NAMES:
+        try:
+            return _iam().get_role(RoleName=name)["Role"]["Arn"]
+        except Exception:
+            pass
+    try:
+        paginator = _iam().get_paginator("list_roles")
+        for page in paginator.paginate(PathPrefix="/service-role/", PaginationConfig={"PageSize": 1000}):
+            for r in page.get("Roles", []):
+                if r.get("RoleName", "").startswith("AmazonSageMaker-ExecutionRole"):
+                    return r["Arn"]
+    except Exception:
+        pass
+    return None
 
 def _resolve_sagemaker_role() -> str:
     env_role = os.environ.get("SAGEMAKER_EXECUTION_ROLE_ARN")
     if env_role:
         print(f"Using IAM role from env: {env_role}")
         return env_role
+    cached_role = _read_role_cache("arn")
+    if cached_role:
+        print(f"Using cached IAM role: {cached_role}")
+        return cached_role
     try:
-        return sagemaker.get_execution_role()
-    except Exception:
-        pass
-    try:
-        iam = boto3.client("iam")
-        marker = None
-        while True:
-            kwargs = {"Marker": marker} if marker else {}
-            resp = iam.list_roles(**kwargs)
-            for r in resp.get("Roles", []):
-                if r.get("RoleName", "").startswith("AmazonSageMaker-ExecutionRole"):
-                    print(f"Using discovered IAM role: {r['Arn']}")
-                    return r["Arn"]
-            if resp.get("IsTruncated"):
-                marker = resp.get("Marker")
-            else:
-                break
+        return sagemaker.get_execution_role(sagemaker_session=_sagemaker_session())
     except Exception:
         pass
-    account = boto3.client("sts").get_caller_identity()["Account"]
+    discovered = _discover_sagemaker_role()
+    if discovered:
+        print(f"Using discovered IAM role: {discovered}")
+        _write_role_cache("arn", discovered)
+        return discovered
+    account = _account_id()
     fallback = f"arn:aws:iam::{account}:role/service-role/AmazonSageMaker-ExecutionRole"
     print(f"Using fallback IAM role: {fallback}")
     return fallback
 
-role = _resolve_sagemaker_role()
-bucket = sagemaker.Session().default_bucket()
+@lru_cache(maxsize=1)
+def _role():
+    return _resolve_sagemaker_role()
+
+def _default_bucket():
+    # default_bucket() may call STS and create the bucket; the session caches it
+    return _sagemaker_session().default_bucket()
+
 endpoint_name="delivery-eta-endpoint"
 
-# Create a proper inference script
-def create_inference_script():
-    inference_code = '''
-import os
-import xgboost as xgb
-import numpy as np
-import json
-import logging
+# SageMaker inference handlers, shipped as source_dir so they are versioned with the repo
+INFERENCE_SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference")
+INFERENCE_ENTRY_POINT = "xgboost_inference.py"
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# SageMaker XGBoost container. The SDK resolves the ECR URI from JSON files bundled
+# with the package; do that once and pass image_uri explicitly.
+XGBOOST_FRAMEWORK_VERSION = "1.7-1"
 
-FEATURES = ['product_weight_g','product_volume_cm3','price','freight_value','purchase_hour','purchase_day_of_week','purchase_month']
+@lru_cache(maxsize=1)
+def _image_uri():
+    return sagemaker.image_uris.retrieve("xgboost", REGION, XGBOOST_FRAMEWORK_VERSION, py_version="py3", image_scope="inference")
 
-def model_fn(model_dir):
-    """Load the model from the model_dir directory"""
-    logger.info(f"Loading model from: {model_dir}")
-    
-    # Check for different model file formats
-    model_files = [
-        os.path.join(model_dir, 'model.json'),
-        os.path.join(model_dir, 'model.bst'),
-        os.path.join(model_dir, 'model.pkl'),
-        os.path.join(model_dir, 'model.joblib'),
-        os.path.join(model_dir, 'xgboost-model'),
-        os.path.join(model_dir, 'xgb-model.json'),
-        os.path.join(model_dir, 'xgb-model')
-    ]
-    
-    model = None
-    loaded_model_path = None
-    
-    for model_path in model_files:
-        if os.path.exists(model_path):
-            try:
-                logger.info(f"Attempting to load model from: {model_path}")
-                
-                if model_path.endswith('.json') or model_path.endswith('.bst'):
-                    model = xgb.Booster()
-                    model.load_model(model_path)
-                    logger.info(f"Successfully loaded XGBoost model from: {model_path}")
-                elif model_path.endswith('.pkl') or model_path.endswith('.joblib'):
-                    import joblib
-                    model = joblib.load(model_path)
-                    logger.info(f"Successfully loaded joblib model from: {model_path}")
-                
-                loaded_model_path = model_path
-                break
-                
-            except Exception as e:
-                logger.error(f"Failed to load model from {model_path}: {str(e)}")
-                continue
+# Run artifact written by train.py that SageMaker can load as-is
+SAGEMAKER_TARBALL_ARTIFACT = "sagemaker/model.tar.gz"
+
+# Endpoint variant settings. m5 is a fixed-performance (non-burstable) family.
+# Set SAGEMAKER_SERVERLESS_MEMORY_MB to host on SageMaker Serverless instead,
+# which suits the low, spiky traffic of this endpoint.
+INSTANCE_TYPE = os.environ.get("SAGEMAKER_INSTANCE_TYPE", "ml.m5.large")
+INSTANCE_COUNT = 1
+SERVERLESS_MEMORY_MB = int(os.environ.get("SAGEMAKER_SERVERLESS_MEMORY_MB", "0"))
+SERVERLESS_MAX_CONCURRENCY = int(os.environ.get("SAGEMAKER_SERVERLESS_MAX_CONCURRENCY", "5"))
+
+# Multi-model endpoint mode: each version is one more tarball under the model prefix
+# and is loaded on first invocation (TargetModel=delivery-eta-v<N>.tar.gz), so deploys
+# don't restart the endpoint containers. Requires instance hosting, not Serverless.
+MULTI_MODEL = os.environ.get("SAGEMAKER_MULTI_MODEL", "").lower() == "true"
+MULTI_MODEL_PREFIX = "multi-model/delivery-eta/"
+
+# Container env var recording what a SageMaker model was built from
+DEPLOY_FINGERPRINT_ENV = "DELIVERY_ETA_DEPLOY_FINGERPRINT"
+
+def _download_s3_prefix(s3_uri, dst_path, max_workers=16):
+    """Download everything under an s3:// prefix straight from S3, bypassing the tracking server"""
+    src_bucket, _, prefix = s3_uri[len("s3://"):].partition("/")
+    prefix = prefix.rstrip("/") + "/"
+    keys = []
+    for page in _s3().get_paginator("list_objects_v2").paginate(Bucket=src_bucket, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []) if not obj["Key"].endswith("/"))
+    if not keys:
+        return None
+
+    local_root = os.path.join(dst_path, posixpath.basename(prefix.rstrip("/")))
+
+    def _fetch(key):
+        local_file = os.path.join(local_root, *key[len(prefix):].split("/"))
+        os.makedirs(os.path.dirname(local_file), exist_ok=True)
+        _s3().download_file(src_bucket, key, local_file, Config=_XFER)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(_fetch, keys))
+    print(f"Downloaded {len(keys)} artifact files from {s3_uri} to {local_root}")
+    return local_root
+
+def _download_model_artifacts(artifact_uri, dst_path, max_workers=16):
+    """Download model artifacts, fetching the individual files in parallel"""
+    if artifact_uri.startswith("s3://"):
+        try:
+            local_root = _download_s3_prefix(artifact_uri, dst_path, max_workers)
+            if local_root:
+                return local_root
+        except Exception as e:
+            print(f"Direct S3 download failed, falling back to MLflow: {e}")
+
+    repo = get_artifact_repository(artifact_uri)
+
+    def _list_files(path=None):
+        files = []
+        for info in repo.list_artifacts(path):
+            if info.is_dir:
+                files.extend(_list_files(info.path))
+            else:
+                files.append(info.path)
+        return files
+
+    files = _list_files()
+    if not files:
+        # Nothing listable from this URI, let MLflow resolve it the slow way
+        return mlflow.artifacts.download_artifacts(artifact_uri=artifact_uri, dst_path=dst_path)
+
+    # Keep the same layout as mlflow.artifacts.download_artifacts (<dst>/<model dir>/...)
+    local_root = os.path.join(dst_path, posixpath.basename(artifact_uri.rstrip("/")))
+    os.makedirs(local_root, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda f: repo.download_artifacts(f, dst_path=local_root), files))
+    print(f"Downloaded {len(files)} artifact files to {local_root}")
+    return local_root
+
+def _file_sha256(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _write_model_tarball(tar_path, source, arcname):
+    """Package model artifacts as tar.gz, using pigz for multi-core gzip when available"""
+    pigz = shutil.which("pigz")
+    if pigz:
+        with open(tar_path, "wb") as out:
+            proc = subprocess.Popen([pigz, "-1", "-p", str(os.cpu_count() or 1)], stdin=subprocess.PIPE, stdout=out)
+            with tarfile.open(fileobj=proc.stdin, mode="w|") as tar:
+                tar.add(source, arcname=arcname)
+            proc.stdin.close()
+            if proc.wait() != 0:
+                raise RuntimeError(f"pigz exited with code {proc.returncode}")
+    else:
+        # Level 1 is enough: the S3 upload is network-bound, not size-bound
+        with tarfile.open(tar_path, "w:gz", compresslevel=1) as tar:
+            tar.add(source, arcname=arcname)
+
+def _logged_sagemaker_tarball(model_version):
+    """Return the s3:// URI of the model.tar.gz that train.py logged with this version's run, if any"""
+    try:
+        artifact_uri = _client().get_run(model_version.run_id).info.artifact_uri
+    except Exception:
+        return None
+    if not artifact_uri or not artifact_uri.startswith("s3://"):
+        return None
+    tar_uri = f"{artifact_uri.rstrip('/')}/{SAGEMAKER_TARBALL_ARTIFACT}"
+    src_bucket, _, key = tar_uri[len("s3://"):].partition("/")
+    try:
+        _s3().head_object(Bucket=src_bucket, Key=key)
+    except Exception:
+        return None
+    return tar_uri
+
+def _package_model_version(model_version, bucket):
+    """Download, package and upload a model version; returns the S3 URI of its model.tar.gz"""
+    # Reuse the artifacts and tarball from an earlier deploy of this exact version
+    cache_dir = os.path.join(MODEL_CACHE_DIR, "delivery-eta-model", f"v{model_version.version}")
+    model_tar_path = os.path.join(cache_dir, "model.tar.gz")
+    meta_path = os.path.join(cache_dir, "version.json")
+    cache_key = {"run_id": model_version.run_id, "source": model_version.source}
+    meta = {}
+    if os.path.exists(meta_path) and os.path.exists(model_tar_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
     
-    if model is None:
-        # Check what files are actually available
-        available_files = []
-        for root, dirs, files in os.walk(model_dir):
+    if meta.get("run_id") == cache_key["run_id"] and meta.get("source") == cache_key["source"]:
+        print(f"Using cached model artifacts: {cache_dir}")
+        tar_sha256 = meta["sha256"]
+    else:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        local_path = os.path.join(cache_dir, "artifacts")
+        os.makedirs(local_path, exist_ok=True)
+        _download_model_artifacts(model_version.source, local_path)
+        
+        # Check what files were downloaded
+        print(f"Downloaded files: {os.listdir(local_path)}")
+        for root, dirs, files in os.walk(local_path):
             for file in files:
-                available_files.append(os.path.join(root, file))
+                print(f"Found file: {os.path.join(root, file)}")
         
-        error_msg = f"No supported model file found under {model_dir}. Available files: {available_files}"
-        logger.error(error_msg)
-        raise FileNotFoundError(error_msg)
-    
-    logger.info(f"Model loaded successfully from: {loaded_model_path}")
-    return model
-
-def input_fn(request_body, request_content_type):
-    """Parse input data"""
-    logger.info(f"Content type: {request_content_type}")
+        # Create model tarball with proper structure
+        _write_model_tarball(model_tar_path, local_path, ".")
+        tar_sha256 = _file_sha256(model_tar_path)
+        with open(meta_path, "w") as f:
+            json.dump({**cache_key, "sha256": tar_sha256}, f)
     
-    if request_content_type == 'application/json':
-        data = json.loads(request_body)
-        if isinstance(data, dict) and 'instances' in data:
-            # TF serving format
-            return np.array(data['instances'], dtype=np.float32)
-        else:
-            # Direct array format
-            return np.array(data, dtype=np.float32)
-    elif request_content_type == 'text/csv':
-        # Parse CSV
-        values = [float(x.strip()) for x in request_body.split(',')]
-        return np.array(values, dtype=np.float32).reshape(1, -1)
+    # Upload to S3, unless the object there already holds the same bytes
+    model_key = f"models/delivery-eta-v{model_version.version}/model.tar.gz"
+    s3_model_path = f"s3://{bucket}/{model_key}"
+    try:
+        existing_sha256 = _s3().head_object(Bucket=bucket, Key=model_key).get("Metadata", {}).get("sha256")
+    except Exception:
+        existing_sha256 = None
+    if existing_sha256 == tar_sha256:
+        print(f"Model tarball unchanged in S3, skipping upload: {s3_model_path}")
     else:
-        raise ValueError(f"Unsupported content type: {request_content_type}")
+        _s3().upload_file(model_tar_path, bucket, model_key, ExtraArgs={"Metadata": {"sha256": tar_sha256}}, Config=_XFER)
+    return s3_model_path
 
-def predict_fn(input_data, model):
-    """Make predictions"""
-    if isinstance(model, xgb.Booster):
-        dmatrix = xgb.DMatrix(input_data, feature_names=FEATURES)
-        return model.predict(dmatrix)
+def _production_variant(model_name):
+    variant = {
+        "VariantName": "AllTraffic",
+        "ModelName": model_name,
+        "InitialVariantWeight": 1.0,
+    }
+    if SERVERLESS_MEMORY_MB and not MULTI_MODEL:
+        variant["ServerlessConfig"] = {
+            "MemorySizeInMB": SERVERLESS_MEMORY_MB,
+            "MaxConcurrency": SERVERLESS_MAX_CONCURRENCY,
+        }
     else:
-        return model.predict(input_data)
+        variant["InitialInstanceCount"] = INSTANCE_COUNT
+        variant["InstanceType"] = INSTANCE_TYPE
+        # Loading the model can be slow on a cold container; don't fail the rollout early
+        variant["ContainerStartupHealthCheckTimeoutInSeconds"] = 600
+        # Send each request to the instance with the fewest in flight, not a random one
+        variant["RoutingConfig"] = {"RoutingStrategy": "LEAST_OUTSTANDING_REQUESTS"}
+    return variant
 
-def output_fn(prediction, accept):
-    """Format output"""
-    if accept == 'application/json':
-        return json.dumps({'predictions': prediction.tolist()})
+def _deploy_fingerprint(model_data_url):
+    """Hash of everything that ends up on the endpoint: model bytes (ETag), inference code and variant"""
+    if model_data_url.endswith("/"):
+        # Multi-model prefix: the models under it change without touching the endpoint
+        etag = None
     else:
-        # Default to CSV
-        return ','.join(str(x) for x in prediction)
-'''
-    
-    # Write inference script to a temporary file
-    inference_script_path = '/tmp/inference.py'
-    with open(inference_script_path, 'w') as f:
-        f.write(inference_code)
-    
-    return inference_script_path
+        src_bucket, _, key = model_data_url[len("s3://"):].partition("/")
+        etag = _s3().head_object(Bucket=src_bucket, Key=key)["ETag"]
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"model_data": model_data_url, "etag": etag, "variant": _production_variant("")}, sort_keys=True).encode())
+    for root, dirs, files in sorted(os.walk(INFERENCE_SOURCE_DIR)):
+        for file in sorted(files):
+            if file.endswith((".py", ".txt")):
+                with open(os.path.join(root, file), "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
 
-def deploy_production_model():
-    """Deploy the Production model from MLflow to SageMaker"""
+def _endpoint_fingerprint(name):
+    """Fingerprint of the model an InService endpoint is serving, or None"""
+    try:
+        endpoint = _sm().describe_endpoint(EndpointName=name)
+        if endpoint.get("EndpointStatus") != "InService":
+            return None
+        config = _sm().describe_endpoint_config(EndpointConfigName=endpoint["EndpointConfigName"])
+        variants = config["ProductionVariants"]
+        if len(variants) != 1:
+            return None
+        model = _sm().describe_model(ModelName=variants[0]["ModelName"])
+        return model.get("PrimaryContainer", {}).get("Environment", {}).get(DEPLOY_FINGERPRINT_ENV)
+    except Exception:
+        return None
+
+def deploy_production_model(wait=True):
+    """Deploy the Production model from MLflow to SageMaker
+    
+    With wait=False the endpoint create/update is started and the function returns
+    immediately; a later pipeline step is expected to wait for InService.
+    """
     try:
         # Check if model registry exists
         try:
             # Get Production model from MLflow
-            prod_versions = client.get_latest_versions("delivery-eta-model", ["Production"])
+            prod_versions = _client().get_latest_versions("delivery-eta-model", ["Production"])
         except Exception as registry_error:
             print(f"Model registry not accessible: {registry_error}")
             print("No models in registry. Use backup deployment instead.")
@@ -172,14 +394,14 @@ def deploy_production_model():
             
         if not prod_versions:
             print("No Production model found. Checking for Staging model...")
-            staging_versions = client.get_latest_versions("delivery-eta-model", ["Staging"])
+            staging_versions = _client().get_latest_versions("delivery-eta-model", ["Staging"])
             if not staging_versions:
                 print("No models found in Staging or Production")
                 print("Use backup deployment with local model instead.")
                 return False
             model_version = staging_versions[0]
             # Promote to Production
-            client.transition_model_version_stage(
+            _client().transition_model_version_stage(
                 "delivery-eta-model", 
                 model_version.version, 
                 "Production"
@@ -189,89 +411,95 @@ def deploy_production_model():
             model_version = prod_versions[0]
         
         print(f"Deploying model version {model_version.version} to SageMaker...")
+        bucket = _default_bucket()
         
-        # Download model artifacts
-        local_path = "/tmp/mlflow_model"
-        os.makedirs(local_path, exist_ok=True)
-        mlflow.artifacts.download_artifacts(
-            artifact_uri=model_version.source,
-            dst_path=local_path
-        )
-        
-        # Check what files were downloaded
-        print(f"Downloaded files: {os.listdir(local_path)}")
-        for root, dirs, files in os.walk(local_path):
-            for file in files:
-                print(f"Found file: {os.path.join(root, file)}")
-        
-        # Create model tarball with proper structure
-        model_tar_path = "/tmp/model.tar.gz"
-        with tarfile.open(model_tar_path, "w:gz") as tar:
-            tar.add(local_path, arcname=".")
+        # Prefer the SageMaker-ready tarball logged at training time: no download or re-upload
+        s3_model_path = _logged_sagemaker_tarball(model_version)
+        if s3_model_path:
+            print(f"Using model tarball logged with the run: {s3_model_path}")
+        else:
+            s3_model_path = _package_model_version(model_version, bucket)
         
-        # Upload to S3
-        s3_model_path = f"s3://{bucket}/models/delivery-eta-v{model_version.version}/model.tar.gz"
-        s3_client = boto3.client("s3")
-        s3_client.upload_file(model_tar_path, bucket, f"models/delivery-eta-v{model_version.version}/model.tar.gz")
+        model_data = s3_model_path
+        if MULTI_MODEL:
+            # Publishing the version is just a copy into the multi-model prefix
+            target_model = f"delivery-eta-v{model_version.version}.tar.gz"
+            src_bucket, _, src_key = s3_model_path[len("s3://"):].partition("/")
+            _s3().copy({"Bucket": src_bucket, "Key": src_key}, bucket, f"{MULTI_MODEL_PREFIX}{target_model}", Config=_XFER)
+            model_data = f"s3://{bucket}/{MULTI_MODEL_PREFIX}"
+            print(f"Model v{model_version.version} published to {model_data} as TargetModel={target_model}")
         
-        # Create inference script
-        inference_script_path = create_inference_script()
+        # Nothing to do if the endpoint already serves these exact bytes with the same settings
+        fingerprint = _deploy_fingerprint(model_data)
+        if _endpoint_fingerprint(endpoint_name) == fingerprint:
+            print(f"Endpoint {endpoint_name} already serves model v{model_version.version}; skipping update")
+            return True
         
         # Create XGBoost model
         skl_model = XGBoostModel(
-            model_data=s3_model_path,
-            role=role,
-            entry_point=inference_script_path,
-            framework_version='1.7-1',
+            model_data=model_data,
+            role=_role(),
+            entry_point=INFERENCE_ENTRY_POINT,
+            framework_version=XGBOOST_FRAMEWORK_VERSION,
+            image_uri=_image_uri(),
             py_version='py3',
-            sagemaker_session=sagemaker_session,
+            sagemaker_session=_sagemaker_session(),
             code_location=f"s3://{bucket}/code/",
-            source_dir=None  # We're using a direct file path
+            source_dir=INFERENCE_SOURCE_DIR,
+            env={DEPLOY_FINGERPRINT_ENV: fingerprint}
         )
+        if MULTI_MODEL:
+            skl_model = MultiDataModel(
+                name=f"delivery-eta-mme-{int(time.time())}",
+                model_data_prefix=model_data,
+                model=skl_model,
+                sagemaker_session=_sagemaker_session()
+            )
+            skl_model.create(instance_type=INSTANCE_TYPE)
+        elif SERVERLESS_MEMORY_MB:
+            skl_model.create(serverless_inference_config=ServerlessInferenceConfig(
+                memory_size_in_mb=SERVERLESS_MEMORY_MB, max_concurrency=SERVERLESS_MAX_CONCURRENCY
+            ))
+        else:
+            skl_model.create(instance_type=INSTANCE_TYPE)
         
         # Check if endpoint exists and its status
         def _get_status(name: str) -> str:
             try:
-                return sm.describe_endpoint(EndpointName=name).get("EndpointStatus", "Unknown")
+                return _sm().describe_endpoint(EndpointName=name).get("EndpointStatus", "Unknown")
             except Exception:
                 return "NotFound"
         
         status = _get_status(endpoint_name)
         
+        unique_cfg = f"{endpoint_name}-cfg-{int(time.time())}"
+        _sm().create_endpoint_config(
+            EndpointConfigName=unique_cfg,
+            ProductionVariants=[_production_variant(skl_model.name)]
+        )
+        
         if status == "NotFound":
             # Create new endpoint
             print(f"Creating new endpoint: {endpoint_name}")
-            unique_cfg = f"{endpoint_name}-cfg-{int(time.time())}"
-            predictor = skl_model.deploy(
-                initial_instance_count=1,
-                instance_type='ml.m5.large',
-                endpoint_name=endpoint_name,
-                endpoint_config_name=unique_cfg,
-                wait=True
+            _sm().create_endpoint(
+                EndpointName=endpoint_name,
+                EndpointConfigName=unique_cfg
             )
         else:
             # Update existing endpoint
             print(f"Updating existing endpoint: {endpoint_name}")
-            
-            # First create a new endpoint config
-            unique_cfg = f"{endpoint_name}-cfg-{int(time.time())}"
-            
-            # Create the endpoint config
-            skl_model.create_predictor(endpoint_name=endpoint_name).create_endpoint_config(
-                name=unique_cfg,
-                initial_instance_count=1,
-                instance_type='ml.m5.large'
-            )
-            
-            # Update the endpoint
-            sm.update_endpoint(
+            _sm().update_endpoint(
                 EndpointName=endpoint_name,
                 EndpointConfigName=unique_cfg
             )
-            
-            # Wait for update to complete
-            waiter = sm.get_waiter('endpoint_in_service')
-            waiter.wait(EndpointName=endpoint_name)
+        
+        if wait:
+            # Poll every 5s instead of the default 30s so we return soon after InService
+            print(f"Waiting for endpoint {endpoint_name} to be InService...")
+            waiter = _sm().get_waiter('endpoint_in_service')
+            waiter.wait(EndpointName=endpoint_name, WaiterConfig={"Delay": 5, "MaxAttempts": 360})
+        else:
+            print(f"Not waiting for endpoint {endpoint_name}; check its status before invoking it")
         
         print(f"Model v{model_version.version} deployed to SageMaker endpoint: {endpoint_name}")
         return True
@@ -283,7 +511,14 @@ def deploy_production_model():
         return False
 
 if __name__ == "__main__":
-    success = deploy_production_model()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="Return once the endpoint create/update has started instead of waiting for InService"
+    )
+    args = parser.parse_args()
+    success = deploy_production_model(wait=not args.no_wait)
     if not success:
         print("MLflow deployment failed - use backup deployment")
         exit(1)
@@ -8,93 +8,194 @@ import time
 import joblib
 import tarfile
 import json
+import gzip
+import hashlib
+import threading
+from functools import lru_cache
 import xgboost as xgb
 import sagemaker
 from sagemaker.xgboost.model import XGBoostModel
+from sagemaker.serverless import ServerlessInferenceConfig
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from onnx_export import export_onnx
 
-def create_inference_script():
-    """Create inference.py for XGBoost SageMaker deployment"""
-    inference_code = '''
-import os
-import xgboost as xgb
-import numpy as np
-
-FEATURES = ['product_weight_g','product_volume_cm3','price','freight_value',
-            'purchase_hour','purchase_day_of_week','purchase_month']
-
-def _find_model_file(model_dir):
-    for root, _, files in os.walk(model_dir):
-        if 'xgboost-model' in files:
-            return os.path.join(root, 'xgboost-model'), 'booster'
-        for name in ['model.joblib', 'model.pkl', 'model.bin']:
-            if name in files:
-                return os.path.join(root, name), 'joblib'
-    return None, None
-
-def model_fn(model_dir):
-    path, kind = _find_model_file(model_dir)
-    if path is None:
-        raise FileNotFoundError(f'No supported model file found under {model_dir}')
-    if kind == 'booster':
-        booster = xgb.Booster()
-        booster.load_model(path)
-        return booster
-    import joblib
-    return joblib.load(path)
-
-def input_fn(request_body, request_content_type):
-    if request_content_type == 'text/csv':
-        values = [float(x.strip()) for x in request_body.split(',')]
-        return np.array(values, dtype=np.float32).reshape(1, -1)
-    raise ValueError(f'Unsupported content type: {request_content_type}')
-
-def predict_fn(data, booster):
-    dmatrix = xgb.DMatrix(data, feature_names=FEATURES)
-    return booster.predict(dmatrix)
-
-def output_fn(prediction, content_type):
-    return str(float(prediction[0]))
-'''
-    
-    with open("/tmp/inference.py", "w") as f:
-        f.write(inference_code)
-    print("Created XGBoost inference.py")
+REGION = "ap-south-1"
+
+# Build AWS clients once, on first use, from one boto3 session; each boto3.client()
+# call re-creates resolvers and connection pools, and import should not touch AWS
+@lru_cache(maxsize=1)
+def _boto_session():
+    return boto3.session.Session(region_name=REGION)
+
+@lru_cache(maxsize=1)
+def _sm():
+    return _boto_session().client("sagemaker")
+
+@lru_cache(maxsize=1)
+def _s3():
+    return _boto_session().client("s3")
+
+@lru_cache(maxsize=1)
+def _sts():
+    return _boto_session().client("sts")
+
+@lru_cache(maxsize=1)
+def _iam():
+    return _boto_session().client("iam")
+
+# Endpoint hosting, same settings as deploy.py: a fixed-performance instance by
+# default, or SageMaker Serverless when SAGEMAKER_SERVERLESS_MEMORY_MB is set
+INSTANCE_TYPE = os.environ.get("SAGEMAKER_INSTANCE_TYPE", "ml.m5.large")
+SERVERLESS_MEMORY_MB = int(os.environ.get("SAGEMAKER_SERVERLESS_MEMORY_MB", "0"))
+SERVERLESS_MAX_CONCURRENCY = int(os.environ.get("SAGEMAKER_SERVERLESS_MAX_CONCURRENCY", "5"))
+
+def _hosting_kwargs():
+    """Hosting arguments for Model.deploy()"""
+    if SERVERLESS_MEMORY_MB:
+        return {"serverless_inference_config": ServerlessInferenceConfig(
+            memory_size_in_mb=SERVERLESS_MEMORY_MB, max_concurrency=SERVERLESS_MAX_CONCURRENCY
+        )}
+    return {
+        "initial_instance_count": 1,
+        "instance_type": INSTANCE_TYPE,
+        "container_startup_health_check_timeout": 600,
+    }
+
+# Same inference handlers as deploy.py
+INFERENCE_SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference")
+INFERENCE_ENTRY_POINT = "xgboost_inference.py"
+
+# SageMaker XGBoost container. The SDK resolves the ECR URI from JSON files bundled
+# with the package; do that once and pass image_uri explicitly.
+XGBOOST_FRAMEWORK_VERSION = "1.7-1"
+
+@lru_cache(maxsize=1)
+def _image_uri():
+    return sagemaker.image_uris.retrieve("xgboost", REGION, XGBOOST_FRAMEWORK_VERSION, py_version="py3", image_scope="inference")
+
+# Large parts and many parallel PUTs for the model tarball upload
+_XFER = TransferConfig(multipart_threshold=16*1024*1024, multipart_chunksize=64*1024*1024, max_concurrency=32)
+
+def _stream_model_tarball_to_s3(members, bucket, key):
+    """Stream the model tar.gz straight into a multipart S3 upload, with no temp file on disk"""
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def _write_tarball():
+        try:
+            with os.fdopen(write_fd, "wb") as pipe:
+                # Level 0 keeps the gzip container SageMaker expects but skips the deflate
+                # pass; the XGBoost/ONNX payload barely compresses anyway
+                with gzip.GzipFile(fileobj=pipe, mode="wb", compresslevel=0) as gz:
+                    with tarfile.open(fileobj=gz, mode="w|") as tar:
+                        for source, arcname in members:
+                            tar.add(source, arcname=arcname)
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=_write_tarball, daemon=True)
+    writer.start()
+    with os.fdopen(read_fd, "rb") as pipe:
+        _s3().upload_fileobj(pipe, bucket, key, Config=_XFER)
+    writer.join()
+    if errors:
+        # The upload saw a truncated stream; don't leave a corrupt model behind
+        _s3().delete_object(Bucket=bucket, Key=key)
+        raise errors[0]
+
+# Resolved role ARN and account id, reused by later runs until each entry is a day old.
+# Entries are stored per AWS credentials, so another profile or account never sees them.
+ROLE_CACHE_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "deploy_eta", "role.json")
+ROLE_CACHE_TTL = 24 * 3600
+SAGEMAKER_ROLE_NAMES = ["AmazonSageMaker-ExecutionRole-default", "AmazonSageMaker-ExecutionRole"]
+
+def _role_cache_key():
+    # Hash of the access key id: identifies the caller without an STS call or storing the key
+    credentials = _boto_session().get_credentials()
+    if credentials is None:
+        return None
+    return hashlib.sha256(credentials.access_key.encode()).hexdigest()
+
+def _load_role_cache():
+    try:
+        with open(ROLE_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def _resolve_sagemaker_role() -> str:
+def _read_role_cache(name):
+    key = _role_cache_key()
+    entry = _load_role_cache().get(key, {}).get(name) if key else None
+    if entry and time.time() - entry.get("ts", 0) < ROLE_CACHE_TTL:
+        return entry.get("value")
+    return None
+
+def _write_role_cache(name, value):
+    key = _role_cache_key()
+    if not key:
+        return
+    cached = _load_role_cache()
+    cached.setdefault(key, {})[name] = {"value": value, "ts": time.time()}
+    try:
+        os.makedirs(os.path.dirname(ROLE_CACHE_PATH), exist_ok=True)
+        with open(ROLE_CACHE_PATH, "w") as f:
+            json.dump(cached, f)
+    except OSError:
+        pass
+
+def _account_id():
+    account = _read_role_cache("account")
+    if not account:
+        account = _sts().get_caller_identity()["Account"]
+        _write_role_cache("account", account)
+    return account
+
+def _discover_sagemaker_role():
+    """Find a SageMaker execution role without scanning every role in the account."""
+    # Conventional names first: one GetRole call each
+    for name in SAGEMAKER_ROLE_NAMES:
+        try:
+            return _iam().get_role(RoleName=name)["Role"]["Arn"]
+        except Exception:
+            pass
+    # Then service roles only, in large pages, stopping at the first match
+    try:
+        paginator = _iam().get_paginator("list_roles")
+        for page in paginator.paginate(PathPrefix="/service-role/", PaginationConfig={"PageSize": 1000}):
+            for r in page.get("Roles", []):
+                if r.get("RoleName", "").startswith("AmazonSageMaker-ExecutionRole"):
+                    return r["Arn"]
+    except Exception:
+        pass
+    return None
+
+@lru_cache(maxsize=1)
+def _resolve_sagemaker_role(sagemaker_session=None) -> str:
     """Resolve an execution role ARN usable by SageMaker."""
     # 1) Allow explicit override via env var
     env_role = os.environ.get("SAGEMAKER_EXECUTION_ROLE_ARN")
     if env_role:
         print(f"Using IAM role from env: {env_role}")
         return env_role
-    # 2) Try native helper when running inside SageMaker
-    try:
-        return sagemaker.get_execution_role()
-    except Exception:
-        pass
-    # 3) Try to find a role that looks like a SageMaker execution role
+    # 2) Reuse the role discovered by a recent run
+    cached_role = _read_role_cache("arn")
+    if cached_role:
+        print(f"Using cached IAM role: {cached_role}")
+        return cached_role
+    # 3) Try native helper when running inside SageMaker
     try:
-        iam = boto3.client("iam")
-        marker = None
-        candidates = []
-        while True:
-            kwargs = {"Marker": marker} if marker else {}
-            resp = iam.list_roles(**kwargs)
-            for r in resp.get("Roles", []):
-                name = r.get("RoleName", "")
-                if name.startswith("AmazonSageMaker-ExecutionRole"):
-                    candidates.append(r["Arn"])
-            if resp.get("IsTruncated"):
-                marker = resp.get("Marker")
-            else:
-                break
-        if candidates:
-            print(f"Using discovered IAM role: {candidates[0]}")
-            return candidates[0]
+        return sagemaker.get_execution_role(sagemaker_session=sagemaker_session)
     except Exception:
         pass
-    # 4) Fallback to the default naming (may fail if it doesn't exist)
-    account = boto3.client("sts").get_caller_identity()["Account"]
+    # 4) Try to find a role that looks like a SageMaker execution role
+    discovered = _discover_sagemaker_role()
+    if discovered:
+        print(f"Using discovered IAM role: {discovered}")
+        _write_role_cache("arn", discovered)
+        return discovered
+    # 5) Fallback to the default naming (may fail if it doesn't exist)
+    account = _account_id()
     fallback = f"arn:aws:iam::{account}:role/service-role/AmazonSageMaker-ExecutionRole"
     print(f"Using fallback IAM role: {fallback}")
     return fallback
@@ -112,52 +213,51 @@ def deploy_local_model():
     
     print(f"Found local model: {local_model_path}")
     
-    # AWS setup
-    sm = boto3.client("sagemaker", region_name="ap-south-1")
-    role = _resolve_sagemaker_role()
+    # AWS setup: one SageMaker session shared by role lookup, bucket and model
+    sagemaker_session = sagemaker.Session(boto_session=_boto_session(), sagemaker_client=_sm())
+    role = _resolve_sagemaker_role(sagemaker_session)
     # Use SageMaker default bucket to avoid cross-bucket permissions issues
-    bucket = sagemaker.Session().default_bucket()
+    bucket = sagemaker_session.default_bucket()
     
     try:
         # Create model package
         print("Creating model package...")
         
-        # Create inference script
-        create_inference_script()
-        
         # Save a native XGBoost booster expected by algorithm or script
         try:
             model = joblib.load(local_model_path)
             booster = model.get_booster()
             booster.save_model("/tmp/xgboost-model")
-            model_tar_source = "/tmp/xgboost-model"
-            model_tar_name = "xgboost-model"
+            tar_members = [("/tmp/xgboost-model", "xgboost-model")]
+            # ONNX copy is preferred by the inference handlers when onnxruntime is available;
+            # without a data sample at hand it is checked on synthetic rows
+            try:
+                if export_onnx(booster, "/tmp/model.onnx"):
+                    tar_members.append(("/tmp/model.onnx", "model.onnx"))
+            except Exception as e:
+                print(f"ONNX export failed, packaging the booster only: {e}")
         except Exception:
             # Fallback to joblib if booster unavailable
-            model_tar_source = local_model_path
-            model_tar_name = "model.joblib"
-        
-        # Create model tarball
-        with tarfile.open("/tmp/model.tar.gz", "w:gz") as tar:
-            tar.add(model_tar_source, arcname=model_tar_name)
+            tar_members = [(local_model_path, "model.joblib")]
         
-        # Upload to S3
+        # Create model tarball and upload it to S3 in one streaming pass
         model_key = f"backup-models/delivery-eta-{int(time.time())}/model.tar.gz"
         s3_model_path = f"s3://{bucket}/{model_key}"
         
-        boto3.client("s3").upload_file("/tmp/model.tar.gz", bucket, model_key)
+        _stream_model_tarball_to_s3(tar_members, bucket, model_key)
         print(f"Model uploaded to {s3_model_path}")
         
         # Create SageMaker model
         model_name = f"delivery-eta-backup-{int(time.time())}"
         
         # Create XGBoostModel in script mode (xgboost is available in this image)
-        sagemaker_session = sagemaker.Session()
         xgb_model = XGBoostModel(
             model_data=s3_model_path,
             role=role,
-            entry_point="/tmp/inference.py",
-            framework_version="1.7-1",
+            entry_point=INFERENCE_ENTRY_POINT,
+            source_dir=INFERENCE_SOURCE_DIR,
+            framework_version=XGBOOST_FRAMEWORK_VERSION,
+            image_uri=_image_uri(),
             py_version="py3",
             sagemaker_session=sagemaker_session
         )
@@ -167,60 +267,72 @@ def deploy_local_model():
 
         # Ensure stale default-named endpoint-config is removed to avoid name conflict
         try:
-            sm.describe_endpoint_config(EndpointConfigName=endpoint_name)
+            _sm().describe_endpoint_config(EndpointConfigName=endpoint_name)
             print(f"Found stale endpoint-config {endpoint_name}, deleting it before deploy...")
-            sm.delete_endpoint_config(EndpointConfigName=endpoint_name)
+            _sm().delete_endpoint_config(EndpointConfigName=endpoint_name)
         except Exception:
             pass
-        existing_endpoints = sm.list_endpoints(NameContains=endpoint_name).get("Endpoints", [])
 
+        # One exact-name lookup; list_endpoints(NameContains=...) scans the account and
+        # would also match e.g. delivery-eta-endpoint-v2
         def _get_status(name: str) -> str:
             try:
-                return sm.describe_endpoint(EndpointName=name).get("EndpointStatus", "Unknown")
-            except Exception:
-                return "NotFound"
+                return _sm().describe_endpoint(EndpointName=name).get("EndpointStatus", "Unknown")
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") == "ValidationException":
+                    return "NotFound"
+                raise
 
-        if existing_endpoints:
-            status = _get_status(endpoint_name)
+        status = _get_status(endpoint_name)
+        if status != "NotFound":
             if status in ["Failed", "OutOfService"]:
                 print(f"Existing endpoint is {status}. Deleting endpoint: {endpoint_name}")
                 try:
-                    sm.delete_endpoint(EndpointName=endpoint_name)
+                    _sm().delete_endpoint(EndpointName=endpoint_name)
                 except Exception as _:
                     pass
                 # Wait until it's gone
-                import time as _t
-                for _ in range(60):
-                    if _get_status(endpoint_name) == "NotFound":
-                        break
-                    _t.sleep(10)
+                try:
+                    _sm().get_waiter("endpoint_deleted").wait(
+                        EndpointName=endpoint_name,
+                        WaiterConfig={"Delay": 5, "MaxAttempts": 120}
+                    )
+                except Exception as e:
+                    print(f"Endpoint deletion wait failed: {e}")
                 print(f"Creating endpoint: {endpoint_name}")
                 unique_cfg = f"{endpoint_name}-cfg-{int(time.time())}"
                 xgb_model.deploy(
-                    initial_instance_count=1,
-                    instance_type="ml.m5.large",
+                    **_hosting_kwargs(),
                     endpoint_name=endpoint_name,
-                    endpoint_config_name=unique_cfg
+                    endpoint_config_name=unique_cfg,
+                    wait=False
                 )
             else:
                 print(f"Updating endpoint: {endpoint_name}")
                 unique_cfg = f"{endpoint_name}-cfg-{int(time.time())}"
                 xgb_model.deploy(
-                    initial_instance_count=1,
-                    instance_type="ml.m5.large",
+                    **_hosting_kwargs(),
                     endpoint_name=endpoint_name,
-                    endpoint_config_name=unique_cfg
+                    endpoint_config_name=unique_cfg,
+                    wait=False
                 )
         else:
             print(f"Creating endpoint: {endpoint_name}")
             unique_cfg = f"{endpoint_name}-cfg-{int(time.time())}"
             xgb_model.deploy(
-                initial_instance_count=1,
-                instance_type="ml.m5.large",
+                **_hosting_kwargs(),
                 endpoint_name=endpoint_name,
-                endpoint_config_name=unique_cfg
+                endpoint_config_name=unique_cfg,
+                wait=False
             )
         
+        # The SDK's own wait polls every 30s; a 5s waiter returns soon after InService (up to 60 min)
+        print(f"Waiting for endpoint {endpoint_name} to be InService...")
+        _sm().get_waiter("endpoint_in_service").wait(
+            EndpointName=endpoint_name,
+            WaiterConfig={"Delay": 5, "MaxAttempts": 720}
+        )
+        
         print(f"Backup model deployed to SageMaker endpoint: {endpoint_name}")
         return True
         
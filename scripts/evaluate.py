@@ -1,11 +1,48 @@
-import mlflow, pandas as pd, boto3
-from sklearn.metrics import mean_squared_error
+import mlflow, mlflow.xgboost, mlflow.sklearn, pandas as pd, numpy as np, xgboost as xgb, boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 MLFLOW_TRACKING_URI = "http://13.203.199.220:32001/"
 mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
 client = mlflow.tracking.MlflowClient()
 
+# Processed data is fetched as parallel 64 MB ranged GETs
+_XFER = TransferConfig(multipart_threshold=8*1024*1024, multipart_chunksize=64*1024*1024, max_concurrency=16)
+
+# Compact dtypes for the training columns; XGBoost works in float32 anyway
+NUMERIC_DTYPES = {'product_weight_g':'float32','product_volume_cm3':'float32','price':'float32','freight_value':'float32',
+                  'purchase_hour':'int8','purchase_day_of_week':'int8','purchase_month':'int8',
+                  'delivery_duration_days':'float32'}
+
+def load_test_data(s3, columns):
+    """Processed data; the Parquet copy written by train.py holds just these columns"""
+    try:
+        s3.download_file('product-delivery-eta-processed-data','processed_data.parquet','/tmp/data.parquet', Config=_XFER)
+        return pd.read_parquet('/tmp/data.parquet', columns=columns, engine='pyarrow')
+    except Exception:
+        s3.download_file('product-delivery-eta-processed-data','processed_data.csv','/tmp/data.csv', Config=_XFER)
+        return pd.read_csv('/tmp/data.csv', engine='pyarrow', usecols=columns, dtype=NUMERIC_DTYPES)
+
+def load_booster(model_uri):
+    """Native XGBoost booster of a registered model (logged with the xgboost or sklearn flavor)"""
+    try:
+        model = mlflow.xgboost.load_model(model_uri)
+    except Exception:
+        model = mlflow.sklearn.load_model(model_uri)
+    return model.get_booster() if hasattr(model, "get_booster") else model
+
+def predict(booster, dmatrix):
+    """Predict up to the early-stopping best round, like XGBRegressor.predict()"""
+    best_iteration = booster.attr("best_iteration")
+    if best_iteration is not None:
+        return booster.predict(dmatrix, iteration_range=(0, int(best_iteration) + 1))
+    return booster.predict(dmatrix)
+
+def rmse(y_true, y_pred):
+    return float(np.sqrt(np.mean((y_true - y_pred) ** 2)))
+
 def evaluate_models():
     """Evaluate models with fallback for missing models"""
     try:
@@ -20,14 +57,11 @@ def evaluate_models():
             print("This is normal for the first run. Skipping evaluation.")
             return
         
-        # Download test data
-        s3 = boto3.client("s3")
-        s3.download_file('product-delivery-eta-processed-data','processed_data.csv','/tmp/data.csv')
-        df = pd.read_csv('/tmp/data.csv')
-        
         features = ['product_weight_g','product_volume_cm3','price','freight_value',
                     'purchase_hour','purchase_day_of_week','purchase_month']
-        X,y = df[features],df['delivery_duration_days']
+        columns = features + ['delivery_duration_days']
+        # Created here, not in a worker thread: boto3's default session isn't thread-safe to set up
+        s3 = boto3.client("s3", config=Config(max_pool_connections=16))
         
         # Try to load Production and Staging models
         try:
@@ -47,13 +81,20 @@ def evaluate_models():
                 return
             
             if prod_versions and staging_versions:
-                # Compare Production vs Staging
-                prod = mlflow.pyfunc.load_model(f"models:/delivery-eta-model/Production")
-                staging = mlflow.pyfunc.load_model(f"models:/delivery-eta-model/Staging")
+                # Test data and both models are independent downloads; fetch them together
+                with ThreadPoolExecutor(max_workers=3) as pool:
+                    data_future = pool.submit(load_test_data, s3, columns)
+                    prod_future = pool.submit(load_booster, "models:/delivery-eta-model/Production")
+                    staging_future = pool.submit(load_booster, "models:/delivery-eta-model/Staging")
+                    df, prod, staging = data_future.result(), prod_future.result(), staging_future.result()
+                X,y = df[features],df['delivery_duration_days']
                 
-                pr, sr = prod.predict(X), staging.predict(X)
-                prod_rmse = mean_squared_error(y,pr,squared=False)
-                stag_rmse = mean_squared_error(y,sr,squared=False)
+                # Compare Production vs Staging on native boosters sharing one float32 DMatrix
+                dmatrix = xgb.DMatrix(X.to_numpy(dtype=np.float32), feature_names=features)
+                y_true = y.to_numpy(dtype=np.float32)
+                pr, sr = predict(prod, dmatrix), predict(staging, dmatrix)
+                prod_rmse = rmse(y_true, pr)
+                stag_rmse = rmse(y_true, sr)
                 
                 print(f"Production RMSE: {prod_rmse:.4f}")
                 print(f"Staging RMSE: {stag_rmse:.4f}")
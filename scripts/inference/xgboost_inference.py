@@ -0,0 +1,157 @@
+"""
+SageMaker inference handlers for the delivery ETA XGBoost model
+Used as the entry point by both deploy.py and deploy_backup.py
+"""
+import os
+import xgboost as xgb
+import numpy as np
+import json
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FEATURES = ['product_weight_g','product_volume_cm3','price','freight_value','purchase_hour','purchase_day_of_week','purchase_month']
+
+# Supported model files, in order of preference
+MODEL_FILES = [
+    'model.json',
+    'model.bst',
+    'model.xgb',
+    'xgboost-model',
+    'xgb-model.json',
+    'xgb-model',
+    'model.pkl',
+    'model.joblib',
+]
+
+# The model server runs one worker process per vCPU; one thread each avoids oversubscription
+NTHREAD = 1
+
+def _find_model_file(model_dir):
+    """Return the preferred model file anywhere under model_dir (MLflow nests it in a subdirectory)"""
+    found = {}
+    for root, _, files in os.walk(model_dir):
+        for name in files:
+            if name in MODEL_FILES and name not in found:
+                found[name] = os.path.join(root, name)
+    for name in MODEL_FILES:
+        if name in found:
+            return found[name]
+    return None
+
+def _load_onnx_model(model_dir):
+    """ONNX Runtime session for model.onnx under model_dir, or None if unavailable"""
+    try:
+        import onnxruntime
+    except ImportError:
+        return None
+    for root, _, files in os.walk(model_dir):
+        if 'model.onnx' in files:
+            model_path = os.path.join(root, 'model.onnx')
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = NTHREAD
+            session = onnxruntime.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+            logger.info(f"Successfully loaded ONNX model from: {model_path}")
+            return session
+    return None
+
+def _warm_up(model):
+    """Run one prediction at load time so the first request doesn't pay for lazy initialisation"""
+    predict_fn(np.zeros((1, len(FEATURES)), dtype=np.float32), model)
+    return model
+
+def model_fn(model_dir):
+    """Load the model from the model_dir directory"""
+    logger.info(f"Loading model from: {model_dir}")
+
+    # Tree ensembles run faster under ONNX Runtime than through the XGBoost Python API
+    onnx_session = _load_onnx_model(model_dir)
+    if onnx_session is not None:
+        return _warm_up(onnx_session)
+
+    model_path = _find_model_file(model_dir)
+    if model_path is None:
+        # Check what files are actually available
+        available_files = []
+        for root, dirs, files in os.walk(model_dir):
+            for file in files:
+                available_files.append(os.path.join(root, file))
+
+        error_msg = f"No supported model file found under {model_dir}. Available files: {available_files}"
+        logger.error(error_msg)
+        raise FileNotFoundError(error_msg)
+
+    if model_path.endswith('.pkl') or model_path.endswith('.joblib'):
+        import joblib
+        model = joblib.load(model_path)
+        logger.info(f"Successfully loaded joblib model from: {model_path}")
+        # Serve the raw booster rather than the sklearn wrapper
+        if hasattr(model, 'get_booster'):
+            model = model.get_booster()
+    else:
+        model = xgb.Booster()
+        model.load_model(model_path)
+        logger.info(f"Successfully loaded XGBoost model from: {model_path}")
+
+    if isinstance(model, xgb.Booster):
+        model.set_param({'nthread': NTHREAD})
+    return _warm_up(model)
+
+def input_fn(request_body, request_content_type):
+    """Parse input data into a (rows, features) array; one row or a whole batch per request"""
+    logger.info(f"Content type: {request_content_type}")
+    if isinstance(request_body, (bytes, bytearray)):
+        request_body = request_body.decode('utf-8')
+
+    if request_content_type == 'application/json':
+        data = json.loads(request_body)
+        if isinstance(data, dict) and 'instances' in data:
+            # TF serving format
+            data = data['instances']
+        # A single row or a list of rows
+        rows = np.array(data, dtype=np.float32)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        if rows.ndim != 2 or rows.shape[1] != len(FEATURES):
+            raise ValueError(f"Expected rows of {len(FEATURES)} features, got shape {rows.shape}")
+        return rows
+    elif request_content_type == 'text/csv':
+        # One row per line; every line must hold exactly one value per feature
+        lines = request_body.strip().splitlines()
+        for number, line in enumerate(lines, 1):
+            if line.count(',') != len(FEATURES) - 1:
+                raise ValueError(f"CSV line {number} has {line.count(',') + 1} values, expected {len(FEATURES)}")
+        # The whole body is parsed in one C call, no per-value Python floats; fromstring
+        # stops at the first empty or non-numeric value, which shows up as a short array
+        rows = np.fromstring(','.join(lines), sep=',', dtype=np.float32)
+        if rows.size != len(lines) * len(FEATURES):
+            raise ValueError("CSV body has empty or non-numeric values")
+        return rows.reshape(-1, len(FEATURES))
+    else:
+        raise ValueError(f"Unsupported content type: {request_content_type}")
+
+def predict_fn(input_data, model):
+    """Make predictions"""
+    if hasattr(model, 'get_inputs'):
+        # ONNX Runtime session
+        input_name = model.get_inputs()[0].name
+        return model.run(None, {input_name: np.asarray(input_data, dtype=np.float32)})[0].ravel()
+    if isinstance(model, xgb.Booster):
+        dmatrix = xgb.DMatrix(input_data, feature_names=FEATURES)
+        # Early-stopped models keep the extra rounds; predict with the best ones only
+        best_iteration = model.attr('best_iteration')
+        if best_iteration is not None:
+            return model.predict(dmatrix, iteration_range=(0, int(best_iteration) + 1))
+        return model.predict(dmatrix)
+    else:
+        return model.predict(input_data)
+
+def output_fn(prediction, accept):
+    """Format output, one prediction per input row"""
+    if accept == 'application/json':
+        return json.dumps({'predictions': prediction.tolist()})
+    else:
+        # Default to CSV, one line per row
+        return '\n'.join(str(x) for x in prediction)
@@ -4,8 +4,13 @@ from evidently.metric_preset import DataDriftPreset
 
 mlflow.set_tracking_uri("http://13.203.199.220:32001/")
 s3=boto3.client("s3")
-s3.download_file('product-delivery-eta-processed-data','processed_data.csv','/tmp/ref.csv')
-ref=pd.read_csv('/tmp/ref.csv')
+try:
+    s3.download_file('product-delivery-eta-processed-data','processed_data.parquet','/tmp/ref.parquet')
+    ref=pd.read_parquet('/tmp/ref.parquet',engine='pyarrow')
+except Exception:
+    # Processed data not yet converted to Parquet by train.py
+    s3.download_file('product-delivery-eta-processed-data','processed_data.csv','/tmp/ref.csv')
+    ref=pd.read_csv('/tmp/ref.csv')
 cur=ref.sample(frac=0.1)
 
 report=Report(metrics=[DataDriftPreset()])
@@ -0,0 +1,48 @@
+"""
+ONNX export of the delivery ETA XGBoost booster
+Used by train.py and deploy_backup.py; the inference handlers serve model.onnx when it is packaged
+"""
+import numpy as np
+import xgboost as xgb
+
+def _threshold_sample(booster, rows=1000):
+    """Random rows spanning every feature's split thresholds, for when no real data is at hand"""
+    trees = booster.trees_to_dataframe()
+    splits = trees[trees["Feature"] != "Leaf"].groupby("Feature")["Split"].agg(["min", "max"])
+    rng = np.random.default_rng(42)
+    sample = np.zeros((rows, booster.num_features()), dtype=np.float32)
+    for i in range(booster.num_features()):
+        if f"f{i}" in splits.index:
+            low, high = splits.loc[f"f{i}"]
+            sample[:, i] = rng.uniform(low - 1, high + 1, rows)
+    return sample
+
+def export_onnx(booster, path, sample=None):
+    """Write an ONNX copy of the booster for ONNX Runtime serving, checked against the booster's
+    own predictions on sample (a float32 feature array; default: synthetic rows).
+    Returns False, writing nothing, when onnxmltools/onnxruntime are not installed or the
+    predictions differ."""
+    try:
+        import onnxruntime
+        from onnxmltools.convert import convert_xgboost
+        from onnxmltools.convert.common.data_types import FloatTensorType
+    except ImportError:
+        return False
+    best_iteration = booster.attr("best_iteration")
+    # Drop the rounds trained past the early-stopping point, as model.predict() does
+    booster = booster[: int(best_iteration) + 1] if best_iteration is not None else booster.copy()
+    booster.feature_names = None  # the converter only understands f0..fN feature names
+    onnx_model = convert_xgboost(booster, initial_types=[("input", FloatTensorType([None, booster.num_features()]))])
+
+    # The endpoint prefers model.onnx, so only package it if it predicts what the booster does
+    sample = _threshold_sample(booster) if sample is None else np.asarray(sample, dtype=np.float32)
+    expected = booster.predict(xgb.DMatrix(sample))
+    session = onnxruntime.InferenceSession(onnx_model.SerializeToString(), providers=["CPUExecutionProvider"])
+    actual = session.run(None, {"input": sample})[0].ravel()
+    if not np.allclose(actual, expected, rtol=1e-4, atol=1e-4):
+        print(f"ONNX predictions differ from the booster's (max abs diff {np.abs(actual - expected).max():.6f}); not packaging model.onnx")
+        return False
+
+    with open(path, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    return True
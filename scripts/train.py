@@ -1,8 +1,17 @@
-import pandas as pd, boto3, os, mlflow, mlflow.xgboost, xgboost as xgb, joblib
+import pandas as pd, numpy as np, boto3, os, mlflow, mlflow.xgboost, xgboost as xgb, joblib
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 import argparse
 import sys
+import tarfile
+import hashlib
+import json
+import time
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from mlflow.entities import Metric, Param
+from onnx_export import export_onnx
 
 # Environment detection
 IS_SAGEMAKER = '/opt/ml' in os.getcwd() or 'SM_MODEL_DIR' in os.environ
@@ -16,26 +25,34 @@ MLFLOW_TRACKING_URI = os.environ.get('MLFLOW_TRACKING_URI', "http://13.203.199.2
 if os.environ.get("MLFLOW_S3_ENDPOINT_URL", None) == "":
     os.environ.pop("MLFLOW_S3_ENDPOINT_URL", None)
 
+# The tracking server is remote: allow slow responses and retry transient failures.
+# MLflow already reuses one pooled requests.Session for all REST calls.
+os.environ.setdefault("MLFLOW_HTTP_REQUEST_TIMEOUT", "60")
+os.environ.setdefault("MLFLOW_HTTP_REQUEST_MAX_RETRIES", "5")
+
+ENVIRONMENT = 'SageMaker' if IS_SAGEMAKER else 'GitHub Actions' if IS_GITHUB_ACTIONS else 'Local'
+if IS_SAGEMAKER:
+    EXPERIMENT_NAME = "sagemaker-delivery-eta-prediction"
+elif IS_GITHUB_ACTIONS:
+    EXPERIMENT_NAME = "github-actions-delivery-eta-prediction-s3"
+else:
+    EXPERIMENT_NAME = "delivery-eta-prediction"
+
 try:
     mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
     
-    if IS_SAGEMAKER:
-        mlflow.set_experiment("sagemaker-delivery-eta-prediction")
-    elif IS_GITHUB_ACTIONS:
+    if IS_GITHUB_ACTIONS:
         # Ensure experiment stores artifacts in our S3 bucket that GA can write to
         desired_bucket = "product-delivery-eta-model-artifacts"
         desired_prefix = "mlflow-artifacts"
         desired_artifact_location = f"s3://{desired_bucket}/{desired_prefix}"
-        exp_name = "github-actions-delivery-eta-prediction-s3"
-        existing = mlflow.get_experiment_by_name(exp_name)
+        existing = mlflow.get_experiment_by_name(EXPERIMENT_NAME)
         if not existing:
             try:
-                mlflow.create_experiment(exp_name, artifact_location=desired_artifact_location)
+                mlflow.create_experiment(EXPERIMENT_NAME, artifact_location=desired_artifact_location)
             except Exception as _:
                 pass
-        mlflow.set_experiment(exp_name)
-    else:
-        mlflow.set_experiment("delivery-eta-prediction")
+    mlflow.set_experiment(EXPERIMENT_NAME)
     
     # Test MLflow connectivity
     client = mlflow.tracking.MlflowClient()
@@ -51,20 +68,142 @@ except Exception as e:
     print(f"Continuing without MLflow tracking...")
     MLFLOW_AVAILABLE = False
 
-print(f"Environment: {'SageMaker' if IS_SAGEMAKER else 'GitHub Actions' if IS_GITHUB_ACTIONS else 'Local'}")
+print(f"Environment: {ENVIRONMENT}")
 print(f"MLflow Tracking: {'Enabled' if MLFLOW_AVAILABLE else 'Disabled'}")
 
-s3 = boto3.client("s3")
+# Pool sized for the parallel raw-data downloads below
+s3 = boto3.client("s3", config=Config(max_pool_connections=32, retries={"max_attempts": 10, "mode": "adaptive"}))
+# Processed data moves as parallel 64 MB ranged GETs / part uploads
+_XFER = TransferConfig(multipart_threshold=8*1024*1024, multipart_chunksize=64*1024*1024, max_concurrency=16)
 bucket_processed = "product-delivery-eta-processed-data"
+# Processed data is stored as Parquet (Snappy) holding only the training columns;
+# processed_data.csv is the pre-Parquet layout, still read if it's all there is
+key_parquet = "processed_data.parquet"
 key_processed = "processed_data.csv"
 
+parquet_path = "/tmp/processed_data.parquet"
 local_path = "/tmp/processed_data.csv"
 
-# Step 1: Try downloading processed data
+FEATURES = ['product_weight_g','product_volume_cm3','price','freight_value',
+            'purchase_hour','purchase_day_of_week','purchase_month']
+TARGET = 'delivery_duration_days'
+# Compact dtypes for the training columns; XGBoost works in float32 anyway
+NUMERIC_DTYPES = {'product_weight_g':'float32','product_volume_cm3':'float32','price':'float32','freight_value':'float32',
+                  'purchase_hour':'int8','purchase_day_of_week':'int8','purchase_month':'int8',
+                  'delivery_duration_days':'float32'}
+
+def upload_parquet(frame):
+    """Write the training columns to processed_data.parquet and upload it"""
+    frame[FEATURES + [TARGET]].astype(NUMERIC_DTYPES).to_parquet(parquet_path, index=False, engine="pyarrow", compression="snappy")
+    s3.upload_file(parquet_path, bucket_processed, key_parquet, Config=_XFER)
+    remember_local_parquet(processed_data_etag())
+
+# Uncompressed (the model is re-packed into a tarball for SageMaker anyway) and
+# pickle protocol 5, which writes the booster's large buffers with fewer copies
+JOBLIB_DUMP_KWARGS = {"compress": 0, "protocol": 5}
+
+# Inputs of the last training run whose model reached the MLflow registry, so identical reruns can be skipped
+LAST_TRAINED_KEY = "last_trained.json"
+
+# Local copy of the model that deploy_backup.py and test_api.py fall back to
+LOCAL_MODEL_PATH = "./models/latest_model.joblib"
+
+def save_local_model(model):
+    os.makedirs(os.path.dirname(LOCAL_MODEL_PATH), exist_ok=True)
+    joblib.dump(model, LOCAL_MODEL_PATH, **JOBLIB_DUMP_KWARGS)
+    print(f"Model saved locally: {LOCAL_MODEL_PATH}")
+
+def parse_hyperparameters():
+    """Hyperparameters from the command line (SageMaker passes them as --name value)"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_estimators', type=int, default=200)
+    parser.add_argument('--max_depth', type=int, default=5)
+    parser.add_argument('--learning_rate', type=float, default=0.1)
+    args, _ = parser.parse_known_args()
+    return args
+
+def processed_data_etag():
+    try:
+        return s3.head_object(Bucket=bucket_processed, Key=key_parquet)["ETag"]
+    except Exception:
+        return None
+
+# ETag of the S3 object the local processed_data.parquet was fetched from (or uploaded as)
+parquet_etag_path = parquet_path + ".etag"
+
+def remember_local_parquet(etag):
+    if etag:
+        with open(parquet_etag_path, "w") as f:
+            f.write(etag)
+
+def download_processed_parquet():
+    """Fetch processed_data.parquet, unless a rerun in this container already has that version"""
+    etag = processed_data_etag()
+    if etag and os.path.exists(parquet_path) and os.path.exists(parquet_etag_path):
+        with open(parquet_etag_path) as f:
+            if f.read() == etag:
+                print("Local processed data is up to date; skipping download")
+                return
+    s3.download_file(bucket_processed, key_parquet, parquet_path, Config=_XFER)
+    remember_local_parquet(etag)
+
+def training_fingerprint(data_etag):
+    """Hash of what a run trains on and where it registers: processed data version,
+    hyperparameters, this script and the ONNX exporter, environment and MLflow server/experiment"""
+    code = hashlib.sha256()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    # onnx_export.py shapes the packaged model.onnx, so a change there must retrain too
+    for path in (os.path.abspath(__file__), os.path.join(script_dir, "onnx_export.py")):
+        with open(path, "rb") as f:
+            code.update(f.read())
+    code_hash = code.hexdigest()
+    inputs = {"data": data_etag, "hyperparameters": vars(parse_hyperparameters()), "code": code_hash,
+              "environment": ENVIRONMENT, "tracking_uri": MLFLOW_TRACKING_URI, "experiment": EXPERIMENT_NAME}
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+def last_trained():
+    """The last_trained.json record ({"fingerprint", "model_version"}), or {} if there is none"""
+    try:
+        body = s3.get_object(Bucket=bucket_processed, Key=LAST_TRAINED_KEY)["Body"].read()
+        return json.loads(body)
+    except Exception:
+        return {}
+
+def record_trained(fingerprint, model_version):
+    # A single PUT, so readers see either the old record or the new one
+    s3.put_object(Bucket=bucket_processed, Key=LAST_TRAINED_KEY,
+                  Body=json.dumps({"fingerprint": fingerprint, "model_version": model_version}).encode(),
+                  ContentType="application/json")
+
+# Step 0: Skip training when the same data, hyperparameters and code already produced a registered
+# model, after restoring that version as the local model a training run would have left behind.
+# SageMaker jobs always train (they must produce a model); FORCE_RETRAIN=true overrides.
+if MLFLOW_AVAILABLE and not IS_SAGEMAKER and os.environ.get("FORCE_RETRAIN", "").lower() != "true":
+    data_etag = processed_data_etag()
+    record = last_trained()
+    if data_etag and record.get("model_version") and record.get("fingerprint") == training_fingerprint(data_etag):
+        try:
+            save_local_model(mlflow.xgboost.load_model(f"models:/delivery-eta-model/{record['model_version']}"))
+            print(f"Processed data, hyperparameters and code unchanged since model v{record['model_version']}. Skipping training.")
+            sys.exit(0)
+        except Exception as e:
+            print(f"Could not restore model v{record['model_version']} ({e}); training instead")
+
+# Step 1: Try downloading processed data, Parquet first
 try:
-    s3.download_file(bucket_processed, key_processed, local_path)
-    print("Loaded processed data from S3")
-    df = pd.read_csv(local_path)
+    try:
+        download_processed_parquet()
+        df = pd.read_parquet(parquet_path, columns=FEATURES + [TARGET], engine="pyarrow")
+        print("Loaded processed data (Parquet) from S3")
+    except Exception:
+        s3.download_file(bucket_processed, key_processed, local_path, Config=_XFER)
+        df = pd.read_csv(local_path, engine="pyarrow", usecols=FEATURES + [TARGET], dtype=NUMERIC_DTYPES)
+        print("Loaded processed data (CSV) from S3")
+        try:
+            upload_parquet(df)
+            print("Processed data converted to Parquet in S3")
+        except Exception as e:
+            print(f"Parquet upload failed: {e}")
 
 except Exception as e:
     print("Processed data not found in S3. Building from raw dataset...")
@@ -74,79 +213,129 @@ except Exception as e:
     os.makedirs(local_dir, exist_ok=True)
 
     paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=raw_bucket):
-        for obj in page.get("Contents", []):
-            s3.download_file(raw_bucket, obj["Key"], os.path.join(local_dir, os.path.basename(obj["Key"])))
+    raw_keys = [obj["Key"] for page in paginator.paginate(Bucket=raw_bucket)
+                for obj in page.get("Contents", []) if not obj["Key"].endswith("/")]
+    # The files are independent; fetch them concurrently instead of one after another
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda key: s3.download_file(raw_bucket, key, os.path.join(local_dir, os.path.basename(key))), raw_keys))
 
-    # Load datasets
-    orders_df = pd.read_csv(f"{local_dir}/olist_orders_dataset.csv")
-    order_items_df = pd.read_csv(f"{local_dir}/olist_order_items_dataset.csv")
-    products_df = pd.read_csv(f"{local_dir}/olist_products_dataset.csv")
-    customers_df = pd.read_csv(f"{local_dir}/olist_customers_dataset.csv")
-    sellers_df = pd.read_csv(f"{local_dir}/olist_sellers_dataset.csv")
+    # Load datasets: only the columns the features need, numbers as float32
+    # (what XGBoost trains on anyway)
+    f32 = "float32"
+    orders_df = pd.read_csv(f"{local_dir}/olist_orders_dataset.csv",
+                            usecols=["order_id","customer_id","order_purchase_timestamp","order_delivered_customer_date"])
+    order_items_df = pd.read_csv(f"{local_dir}/olist_order_items_dataset.csv",
+                                 usecols=["order_id","product_id","seller_id","price","freight_value"],
+                                 dtype={"price":f32,"freight_value":f32})
+    products_df = pd.read_csv(f"{local_dir}/olist_products_dataset.csv",
+                              usecols=["product_id","product_weight_g","product_length_cm","product_height_cm","product_width_cm"],
+                              dtype={"product_weight_g":f32,"product_length_cm":f32,"product_height_cm":f32,"product_width_cm":f32})
+    customers_df = pd.read_csv(f"{local_dir}/olist_customers_dataset.csv", usecols=["customer_id"])
+    sellers_df = pd.read_csv(f"{local_dir}/olist_sellers_dataset.csv", usecols=["seller_id"])
 
     # Merge + process
-    merged_df = order_items_df.merge(orders_df,on="order_id") \
-                              .merge(products_df,on="product_id") \
-                              .merge(customers_df,on="customer_id") \
-                              .merge(sellers_df,on="seller_id")
+    merged_df = order_items_df.merge(orders_df,on="order_id",copy=False) \
+                              .merge(products_df,on="product_id",copy=False) \
+                              .merge(customers_df,on="customer_id",copy=False) \
+                              .merge(sellers_df,on="seller_id",copy=False)
 
-    merged_df["order_purchase_timestamp"] = pd.to_datetime(merged_df["order_purchase_timestamp"], errors="coerce")
-    merged_df["order_delivered_customer_date"] = pd.to_datetime(merged_df["order_delivered_customer_date"], errors="coerce")
+    # Olist timestamps share one layout; an explicit format skips per-value format inference
+    ts_format = "%Y-%m-%d %H:%M:%S"
+    merged_df["order_purchase_timestamp"] = pd.to_datetime(merged_df["order_purchase_timestamp"], format=ts_format, errors="coerce", cache=True)
+    merged_df["order_delivered_customer_date"] = pd.to_datetime(merged_df["order_delivered_customer_date"], format=ts_format, errors="coerce", cache=True)
     merged_df = merged_df.dropna(subset=["order_purchase_timestamp","order_delivered_customer_date"])
 
-    merged_df["delivery_duration_days"] = (
-        merged_df["order_delivered_customer_date"] - merged_df["order_purchase_timestamp"]
-    ).dt.total_seconds() / (24*3600)
+    # Work on the int64 nanosecond values directly: no Timedelta Series in between
+    purchased_ns = merged_df["order_purchase_timestamp"].to_numpy().view("i8")
+    delivered_ns = merged_df["order_delivered_customer_date"].to_numpy().view("i8")
+    merged_df["delivery_duration_days"] = ((delivered_ns - purchased_ns) / (86400 * 1e9)).astype("float32")
 
     merged_df = merged_df[(merged_df["delivery_duration_days"] > 0) & (merged_df["delivery_duration_days"] < 60)]
-    merged_df["purchase_hour"] = merged_df["order_purchase_timestamp"].dt.hour
-    merged_df["purchase_day_of_week"] = merged_df["order_purchase_timestamp"].dt.dayofweek
-    merged_df["purchase_month"] = merged_df["order_purchase_timestamp"].dt.month
-    merged_df["product_volume_cm3"] = merged_df["product_length_cm"] * merged_df["product_height_cm"] * merged_df["product_width_cm"]
+    # One DatetimeIndex for all three calendar features instead of a .dt accessor each
+    purchased = pd.DatetimeIndex(merged_df["order_purchase_timestamp"])
+    merged_df["purchase_hour"] = purchased.hour.to_numpy().astype("int8")
+    merged_df["purchase_day_of_week"] = purchased.dayofweek.to_numpy().astype("int8")
+    merged_df["purchase_month"] = purchased.month.to_numpy().astype("int8")
+    merged_df["product_volume_cm3"] = np.multiply.reduce(
+        [merged_df[c].to_numpy() for c in ("product_length_cm","product_height_cm","product_width_cm")]
+    )
 
     # Save + upload
-    merged_df.to_csv(local_path,index=False)
-    s3.upload_file(local_path, bucket_processed, key_processed)
+    upload_parquet(merged_df)
     print("Processed data built & uploaded to S3")
     df = merged_df
 
+def log_sagemaker_tarball(model, sample):
+    """Log a SageMaker-ready model.tar.gz with the active run so deploy.py can point
+    the endpoint at it directly instead of downloading and re-packaging the model.
+    sample: feature rows the ONNX copy is checked against before it is packaged"""
+    booster_path = "/tmp/xgboost-model"
+    tar_path = "/tmp/sagemaker_model/model.tar.gz"
+    os.makedirs(os.path.dirname(tar_path), exist_ok=True)
+    onnx_path = "/tmp/model.onnx"
+    booster = model.get_booster()
+    booster.save_model(booster_path)
+    has_onnx = export_onnx(booster, onnx_path, sample)
+    with tarfile.open(tar_path, "w:gz", compresslevel=1) as tar:
+        tar.add(booster_path, arcname="xgboost-model")
+        if has_onnx:
+            tar.add(onnx_path, arcname="model.onnx")
+    mlflow.log_artifact(tar_path, artifact_path="sagemaker")
+
+def log_run_data(run, params, metrics):
+    """Log params and metrics in one log-batch request instead of one per call"""
+    timestamp = int(time.time() * 1000)
+    mlflow.tracking.MlflowClient().log_batch(
+        run.info.run_id,
+        metrics=[Metric(k, float(v), timestamp, 0) for k, v in metrics.items()],
+        params=[Param(k, str(v)) for k, v in params.items()],
+    )
+
 def train_model(df):
-    """Training function that works both locally and in SageMaker"""
-    features = ['product_weight_g','product_volume_cm3','price','freight_value',
-                'purchase_hour','purchase_day_of_week','purchase_month']
-    target = 'delivery_duration_days'
-    X,y = df[features], df[target]
+    """Training function that works both locally and in SageMaker.
+    Returns the model, RMSE, MAE and the registered model version, which is None unless the
+    model, its SageMaker tarball and the Staging promotion all reached the MLflow server"""
+    X,y = df[FEATURES], df[TARGET]
     X_train,X_test,y_train,y_test = train_test_split(X,y,test_size=0.2,random_state=42)
+    # Early-stopping rounds are picked on a slice of the training data, not the test set
+    X_fit,X_val,y_fit,y_val = train_test_split(X_train,y_train,test_size=0.1,random_state=42)
 
     # Parse hyperparameters (for SageMaker)
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--n_estimators', type=int, default=200)
-    parser.add_argument('--max_depth', type=int, default=5)
-    parser.add_argument('--learning_rate', type=float, default=0.1)
-    args, _ = parser.parse_known_args()
+    args = parse_hyperparameters()
     
     params={"objective":"reg:squarederror",
             "n_estimators":args.n_estimators,
             "max_depth":args.max_depth,
-            "learning_rate":args.learning_rate}
+            "learning_rate":args.learning_rate,
+            # Histogram split finding on every core; exact/approx are much slower here
+            "tree_method":"hist",
+            "n_jobs":os.cpu_count(),
+            "early_stopping_rounds":20}
     
-    model=xgb.XGBRegressor(**params).fit(X_train,y_train)
+    model=xgb.XGBRegressor(**params).fit(X_fit,y_fit,eval_set=[(X_val,y_val)],verbose=False)
     preds=model.predict(X_test)
     rmse=mean_squared_error(y_test,preds,squared=False)
     mae=mean_absolute_error(y_test,preds)
+    # Held-out rows the ONNX export is checked against
+    onnx_sample = X_test.to_numpy(dtype=np.float32)[:1000]
+    registered_version = None
     
     if IS_SAGEMAKER:
         # SageMaker: Save model locally, MLflow will track
         model_dir = os.environ.get('SM_MODEL_DIR', '/opt/ml/model')
-        joblib.dump(model, os.path.join(model_dir, 'model.joblib'))
+        joblib.dump(model, os.path.join(model_dir, 'model.joblib'), **JOBLIB_DUMP_KWARGS)
         
         # Log to MLflow (with SageMaker integration)
         if MLFLOW_AVAILABLE:
             with mlflow.start_run() as run:
-                mlflow.log_params(params)
-                mlflow.log_metrics({"rmse":rmse,"mae":mae})
+                log_run_data(run, params, {"rmse":rmse,"mae":mae})
                 mlflow.sklearn.log_model(model, "model", registered_model_name="delivery-eta-model")
+                tarball_logged = False
+                try:
+                    log_sagemaker_tarball(model, onnx_sample)
+                    tarball_logged = True
+                except Exception as tarball_err:
+                    print(f"SageMaker tarball logging failed: {tarball_err}")
                 
                 # Promote to Staging for evaluation
                 client = mlflow.tracking.MlflowClient()
@@ -156,13 +345,14 @@ def train_model(df):
                     version=model_version.version,
                     stage="Staging"
                 )
+                if tarball_logged:
+                    registered_version = model_version.version
     elif IS_GITHUB_ACTIONS:
         # GitHub Actions: Log directly to MLflow server without S3 artifacts
         if MLFLOW_AVAILABLE:
             try:
                 with mlflow.start_run() as run:
-                    mlflow.log_params(params)
-                    mlflow.log_metrics({"rmse":rmse,"mae":mae})
+                    log_run_data(run, params, {"rmse":rmse,"mae":mae})
                     
                     # Create a simple model signature
                     from mlflow.models.signature import infer_signature
@@ -170,6 +360,7 @@ def train_model(df):
                     
                     # Log model without storing large artifacts to S3
                     # If artifact logging fails (e.g., registry/S3 unavailable), catch and continue.
+                    model_logged = tarball_logged = False
                     try:
                         mlflow.xgboost.log_model(
                             model,
@@ -177,9 +368,16 @@ def train_model(df):
                             signature=signature,
                             registered_model_name="delivery-eta-model"
                         )
+                        model_logged = True
                     except Exception as artifact_err:
                         print(f"MLflow artifact logging failed: {artifact_err}")
                     
+                    try:
+                        log_sagemaker_tarball(model, onnx_sample)
+                        tarball_logged = True
+                    except Exception as tarball_err:
+                        print(f"SageMaker tarball logging failed: {tarball_err}")
+                    
                     # Promote to Staging automatically for GitHub Actions
                     try:
                         client = mlflow.tracking.MlflowClient()
@@ -193,6 +391,8 @@ def train_model(df):
                                 stage="Staging"
                             )
                             print(f"Model v{model_version.version} promoted to Staging")
+                            if model_logged and tarball_logged:
+                                registered_version = model_version.version
                     except Exception as e:
                         print(f"Model promotion failed: {e}")
             except Exception as e:
@@ -200,11 +400,7 @@ def train_model(df):
                 print("Continuing without MLflow...")
         
         # Always save model locally as backup
-        local_model_dir = "./models"
-        os.makedirs(local_model_dir, exist_ok=True)
-        model_path = os.path.join(local_model_dir, "latest_model.joblib")
-        joblib.dump(model, model_path)
-        print(f"Model saved locally: {model_path}")
+        save_local_model(model)
         
     else:
         # Local training: Use file-based MLflow logging to avoid S3 issues
@@ -213,8 +409,7 @@ def train_model(df):
         
         if MLFLOW_AVAILABLE:
             with mlflow.start_run() as run:
-                mlflow.log_params(params)
-                mlflow.log_metrics({"rmse":rmse,"mae":mae})
+                log_run_data(run, params, {"rmse":rmse,"mae":mae})
                 
                 # Save model locally instead of trying to upload to S3
                 model_path = f"./models/delivery-eta-model-{run.info.run_id}"
@@ -229,14 +424,21 @@ def train_model(df):
                     print(f"Model registration failed: {e}")
         else:
             # No MLflow, save locally
-            model_path = "./models/latest_model.joblib"
-            os.makedirs(os.path.dirname(model_path), exist_ok=True)
-            joblib.dump(model, model_path)
-            print(f"Model saved locally: {model_path}")
+            save_local_model(model)
     
     print(f"Training complete: RMSE={rmse:.4f}, MAE={mae:.4f}")
-    return model, rmse, mae
+    return model, rmse, mae, registered_version
 
 if __name__ == "__main__":
     # Run training
-    model, rmse, mae = train_model(df)
+    model, rmse, mae, registered_version = train_model(df)
+    
+    # Remember these inputs so an identical rerun can skip training, but only once the
+    # model is actually in the remote registry for that rerun to restore
+    if registered_version and not IS_SAGEMAKER:
+        data_etag = processed_data_etag()
+        if data_etag:
+            try:
+                record_trained(training_fingerprint(data_etag), registered_version)
+            except Exception as e:
+                print(f"Could not record training fingerprint: {e}")
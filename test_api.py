@@ -1,6 +1,38 @@
+import asyncio
 import boto3
 import json
+import joblib
+import os
+import time
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from check_runner import run_concurrently
+
+# Optional: with aiobotocore installed, concurrent invocations share one event loop
+try:
+    from aiobotocore.session import get_session as _aio_session
+    from aiobotocore.config import AioConfig
+except ImportError:
+    _aio_session = None
+
+REGION = "ap-south-1"
+
+# One client per service for the whole run, built on first use
+@lru_cache(maxsize=1)
+def _sm():
+    return boto3.client('sagemaker', region_name=REGION)
+
+@lru_cache(maxsize=1)
+def _runtime():
+    # Room for concurrent invocations without queueing on the connection pool
+    return boto3.client('sagemaker-runtime', config=Config(
+        region_name=REGION, max_pool_connections=50,
+        retries={'max_attempts': 3, 'mode': 'standard'}, tcp_keepalive=True
+    ))
 
 # Test data for prediction
 test_data = {
@@ -13,39 +45,121 @@ test_data = {
     "purchase_month": 6
 }
 
-def test_sagemaker_endpoint():
-    """Test the deployed SageMaker endpoint"""
+# Column order the endpoint expects in CSV requests
+FEATURES = ['product_weight_g','product_volume_cm3','price','freight_value',
+            'purchase_hour','purchase_day_of_week','purchase_month']
+
+def _csv_body(records):
+    """CSV request body, one line per record, formatted in one pandas/C pass"""
+    frame = pd.DataFrame.from_records(records, columns=FEATURES)
+    return frame.to_csv(header=False, index=False, lineterminator="\n").strip()
+
+def _parse_predictions(body):
+    """Predictions from a CSV response body (one per line) in one vectorized parse"""
+    return np.fromstring(body.decode("utf-8"), sep="\n", dtype=np.float32)
+
+# Set above 1 to send that many invocations concurrently and report latency percentiles
+ENDPOINT_TEST_REQUESTS = int(os.environ.get("ENDPOINT_TEST_REQUESTS", "1"))
+# Rows per request; raise it to see how much latency batching costs against throughput
+ENDPOINT_TEST_BATCH_SIZE = int(os.environ.get("ENDPOINT_TEST_BATCH_SIZE", "1"))
+
+# Upper bound on a single-row prediction body (one float and a newline)
+SMALL_RESPONSE_BYTES = 64
+
+def _invoke_one(endpoint_name, payload, invoke_kwargs):
+    """Invoke the endpoint once; returns the predictions and the call latency in seconds"""
+    start = time.perf_counter()
+    response = _runtime().invoke_endpoint(
+        EndpointName=endpoint_name,
+        ContentType="text/csv",
+        Accept="text/csv",
+        Body=payload,
+        **invoke_kwargs
+    )
+    # A single-row response fits in one bounded read; only batched responses need the rest of the stream
+    body = response["Body"].read(SMALL_RESPONSE_BYTES)
+    if len(body) == SMALL_RESPONSE_BYTES:
+        body += response["Body"].read()
+    predictions = _parse_predictions(body)
+    return predictions, time.perf_counter() - start
+
+async def _invoke_all_async(endpoint_name, payloads, invoke_kwargs):
+    """_invoke_one for every payload, fanned out over one pooled aiobotocore client"""
+    async with _aio_session().create_client(
+        'sagemaker-runtime', region_name=REGION, config=AioConfig(max_pool_connections=50)
+    ) as client:
+        async def invoke(payload):
+            start = time.perf_counter()
+            response = await client.invoke_endpoint(
+                EndpointName=endpoint_name,
+                ContentType="text/csv",
+                Accept="text/csv",
+                Body=payload,
+                **invoke_kwargs
+            )
+            async with response["Body"] as stream:
+                body = await stream.read()
+            return _parse_predictions(body), time.perf_counter() - start
+        return await asyncio.gather(*(invoke(payload) for payload in payloads))
+
+def test_sagemaker_endpoint(records=None, batch_size=None):
+    """Test the deployed SageMaker endpoint with a list of test_data-style dicts
+    (default: test_data repeated batch_size times), sent as one multi-row CSV request"""
+    if records is None:
+        if batch_size is None:
+            batch_size = ENDPOINT_TEST_BATCH_SIZE
+        records = [test_data] * max(batch_size, 1)
     
     endpoint_name = "delivery-eta-endpoint"
     
     try:
-        # Check if endpoint exists before invoking
-        sm = boto3.client('sagemaker', region_name='ap-south-1')
-        endpoints = sm.list_endpoints(NameContains=endpoint_name).get("Endpoints", [])
-        if not endpoints:
-            print(f"Endpoint {endpoint_name} not found. Skipping endpoint test.")
-            return False
-        # Create SageMaker runtime client
-        runtime = boto3.client('sagemaker-runtime', region_name='ap-south-1')
-        
-        # XGBoost container expects CSV format
-        features = ['product_weight_g','product_volume_cm3','price','freight_value',
-                   'purchase_hour','purchase_day_of_week','purchase_month']
-        csv_input = ",".join(str(test_data[f]) for f in features)
+        # Check if endpoint exists before invoking: one exact-name lookup
+        try:
+            endpoint = _sm().describe_endpoint(EndpointName=endpoint_name)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ValidationException":
+                print(f"Endpoint {endpoint_name} not found. Skipping endpoint test.")
+                return False
+            raise
+        # XGBoost container expects CSV format; encoded once, the same bytes go out on every invocation
+        csv_input = _csv_body(records).encode("ascii")
         
-        print(f"Test Data: {test_data}")
+        print(f"Test Data: {records}")
         print(f"Invoking endpoint: {endpoint_name} (CSV)")
-        print(f"CSV Input: {csv_input}")
+        print(f"CSV Input: {csv_input.decode('ascii')}")
         
-        response = runtime.invoke_endpoint(
-            EndpointName=endpoint_name,
-            ContentType="text/csv",
-            Body=csv_input
-        )
+        # Multi-model endpoints need to be told which model version to use
+        invoke_kwargs = {}
+        target_model = os.environ.get("SAGEMAKER_TARGET_MODEL")
+        if target_model:
+            invoke_kwargs["TargetModel"] = target_model
+        
+        payloads = [csv_input] * max(ENDPOINT_TEST_REQUESTS, 1)
+        if len(payloads) > 1:
+            # Latency percentiles under random routing aren't comparable with deploy.py's setup
+            config = _sm().describe_endpoint_config(EndpointConfigName=endpoint["EndpointConfigName"])
+            for variant in config["ProductionVariants"]:
+                strategy = variant.get("RoutingConfig", {}).get("RoutingStrategy", "RANDOM")
+                if strategy != "LEAST_OUTSTANDING_REQUESTS":
+                    print(f"Warning: variant {variant['VariantName']} uses {strategy} routing, not LEAST_OUTSTANDING_REQUESTS")
+        start = time.perf_counter()
+        if len(payloads) > 1 and _aio_session is not None:
+            results = asyncio.run(_invoke_all_async(endpoint_name, payloads, invoke_kwargs))
+        else:
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                results = list(pool.map(lambda payload: _invoke_one(endpoint_name, payload, invoke_kwargs), payloads))
+        elapsed = time.perf_counter() - start
         
-        result = response["Body"].read().decode("utf-8").strip()
+        predictions = results[0][0]
         print(f"CSV prediction successful!")
-        print(f"Predicted delivery time: {float(result):.2f} days")
+        latencies = sorted(latency for _, latency in results)
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        rps = len(results) / elapsed
+        print(f"{'batch_size':>10} {'requests':>8} {'p50_ms':>8} {'p99_ms':>8} {'req/s':>8} {'rows/s':>8}")
+        print(f"{len(records):>10} {len(results):>8} {p50*1000:>8.1f} {p99*1000:>8.1f} {rps:>8.1f} {rps*len(records):>8.1f}")
+        for prediction in predictions:
+            print(f"Predicted delivery time: {prediction:.2f} days")
         
         return True
         
@@ -53,23 +167,31 @@ def test_sagemaker_endpoint():
         print(f"Endpoint test failed: {str(e)}")
         return False
 
-def test_local_model():
-    """Test locally saved model"""
+@lru_cache(maxsize=1)
+def _get_local_model(path):
+    """Unpickle the local model once per process; call _get_local_model.cache_clear()
+    if the file is replaced while a long-running process still uses it"""
+    return joblib.load(path)
+
+def test_local_model(records=None):
+    """Test locally saved model on a list of test_data-style dicts (default: [test_data])"""
+    if records is None:
+        records = [test_data]
     try:
-        import joblib
-        import os
-        
         model_path = "./models/latest_model.joblib"
         if os.path.exists(model_path):
-            model = joblib.load(model_path)
+            model = _get_local_model(model_path)
             
-            # Create test DataFrame
-            test_df = pd.DataFrame([test_data])
+            # One float32 array in FEATURES order and one predict call for the whole batch;
+            # the DataFrame wrapper only carries the feature names the model was trained with
+            values = np.array([[record[f] for f in FEATURES] for record in records], dtype=np.float32)
+            test_df = pd.DataFrame(values, columns=FEATURES, copy=False)
             
-            prediction = model.predict(test_df)
+            predictions = model.predict(test_df)
             
             print(f"Local model test successful!")
-            print(f"Local prediction: {prediction[0]:.2f} days")
+            for prediction in predictions:
+                print(f"Local prediction: {prediction:.2f} days")
             return True
         else:
             print(f"No local model found at {model_path}")
@@ -83,14 +205,10 @@ if __name__ == "__main__":
     print("Testing Model Predictions")
     print("=" * 40)
     
-    # Test local model first
-    local_ok = test_local_model()
-    print()
+    # Local model and SageMaker endpoint are tested side by side
+    local_ok, endpoint_ok = run_concurrently(test_local_model, test_sagemaker_endpoint)
     
-    # Test SageMaker endpoint
-    endpoint_ok = test_sagemaker_endpoint()
-    
-    print("\n" + "=" * 40)
+    print("=" * 40)
     if local_ok or endpoint_ok:
         print("Model testing completed successfully!")
     else:
@@ -2,6 +2,8 @@
 """
 Quick test to verify MLflow model registration fix
 """
+import os
+import traceback
 import mlflow
 import mlflow.xgboost
 import xgboost as xgb
@@ -17,22 +19,24 @@ mlflow.set_experiment("test-model-registration")
 
 print("🧪 Testing MLflow model registration fix...")
 
-# Create dummy data
-np.random.seed(42)
-X = pd.DataFrame(np.random.rand(100, 7), columns=[
+# Create dummy data (float32, like the training pipeline)
+rng = np.random.default_rng(42)
+X = pd.DataFrame(rng.random((100, 7), dtype=np.float32), columns=[
     'product_weight_g','product_volume_cm3','price','freight_value',
     'purchase_hour','purchase_day_of_week','purchase_month'
 ])
-y = np.random.rand(100) * 10  # Random delivery times
+y = rng.random(100, dtype=np.float32) * 10  # Random delivery times
 
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# Train a simple model
-model = xgb.XGBRegressor(n_estimators=10, max_depth=3)
-model.fit(X_train, y_train)
+# Train a simple model: native API on DMatrices built once, no sklearn-wrapper copies
+dtrain = xgb.DMatrix(X_train, label=y_train)
+dtest = xgb.DMatrix(X_test)
+params = {'max_depth': 3, 'objective': 'reg:squarederror', 'nthread': os.cpu_count()}
+model = xgb.train(params, dtrain, num_boost_round=10)
 
 # Test prediction and signature
-predictions = model.predict(X_test)
+predictions = model.predict(dtest)
 signature = infer_signature(X_train, predictions)
 
 print("✅ Model trained successfully")
@@ -73,7 +77,6 @@ try:
 
 except Exception as e:
     print(f"❌ MLflow test failed: {e}")
-    import traceback
     traceback.print_exc()
 
 print("🏁 MLflow test completed")
\ No newline at end of file